@@ -20,6 +20,8 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
+    path('api/', include('support_app.urls')),
+    path('tgbot/', include('tgbot_app.urls')),
 ]
 
 if settings.DEBUG:
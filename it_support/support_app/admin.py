@@ -10,7 +10,8 @@ class ClientAdmin(admin.ModelAdmin):
 
 @admin.register(m.Contractor)
 class ContractorAdmin(admin.ModelAdmin):
-    pass
+    # поддерживается ботом, пересчитать можно командой recount_contractors_orders
+    readonly_fields = ['in_work_orders_count']
 
 
 @admin.register(m.Manager)
@@ -41,3 +42,13 @@ class AssignedContractorAdmin(admin.ModelAdmin):
 @admin.register(m.SystemSettings)
 class SystemSettingsAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(m.ClientBillingUsage)
+class ClientBillingUsageAdmin(admin.ModelAdmin):
+    list_display = ['client', 'billing_start_date', 'orders_count']
+
+
+@admin.register(m.OrderMonthlyStat)
+class OrderMonthlyStatAdmin(admin.ModelAdmin):
+    list_display = ['billing_start_date', 'client', 'orders_count', 'billing_day']
@@ -0,0 +1,259 @@
+import statistics
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, NamedTuple, Optional
+
+from django.db import DatabaseError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from support_app.models import Client
+from support_app.models import ClientBillingUsage
+from support_app.models import Contractor
+from support_app.models import Order
+from support_app.models import OrderMonthlyStat
+from support_app.models import Tariff
+from support_app.system_settings import system_settings
+
+CLIENTS_SAMPLE_SIZE = 50
+# лимит тарифа PositiveSmallIntegerField, больше не помещается в smallint PostgreSQL
+MAX_ORDERS_LIMIT = 32767
+# счетчик заказов клиента в биллинге сбрасывается раньше, чем дойдет до лимита
+USAGE_RESET_ORDERS = 10000
+
+
+class BenchmarkCase(NamedTuple):
+    """Замеряемый код: run выполняется repeat раз, setup перед каждым запуском и не замеряется"""
+    name: str
+    run: Callable[[], Any]
+    setup: Optional[Callable[[], Any]] = None
+
+
+def get_clients_sample() -> list[Client]:
+    """Клиенты с заказами и без, чтобы предикаты проходили по разным веткам"""
+    return list(Client.objects.select_related('tariff').order_by('pk')[:CLIENTS_SAMPLE_SIZE])
+
+
+def call_for_every(objects: list[Any], method_name: str) -> None:
+    for obj in objects:
+        result = getattr(obj, method_name)()
+        if hasattr(result, '__iter__'):
+            list(result)
+
+
+def reset_monthly_stats() -> None:
+    OrderMonthlyStat.objects.all().delete()
+
+
+def get_cases() -> list[BenchmarkCase]:
+    clients = get_clients_sample()
+    contractors = list(Contractor.objects.order_by('pk')[:CLIENTS_SAMPLE_SIZE])
+    cases = [
+        BenchmarkCase(
+            'OrderQuerySet.get_warning_orders_not_in_work',
+            lambda: list(Order.objects.get_warning_orders_not_in_work()),
+        ),
+        BenchmarkCase(
+            'OrderQuerySet.get_warning_orders_not_closed',
+            lambda: list(Order.objects.get_warning_orders_not_closed()),
+        ),
+        BenchmarkCase(
+            'OrderQuerySet.get_available_not_informed_all',
+            lambda: list(Order.objects.get_available_not_informed_all()),
+        ),
+        BenchmarkCase(
+            'ContractorQuerySet.get_available',
+            lambda: list(Contractor.objects.get_available()),
+        ),
+        BenchmarkCase(
+            'OrderQuerySet.calculate_billing',
+            lambda: list(Order.objects.calculate_billing()),
+        ),
+        BenchmarkCase(
+            'OrderQuerySet.calculate_average_orders_in_month (cold)',
+            lambda: list(Order.objects.calculate_average_orders_in_month()),
+            setup=reset_monthly_stats,
+        ),
+        BenchmarkCase(
+            'OrderQuerySet.calculate_average_orders_in_month',
+            lambda: list(Order.objects.calculate_average_orders_in_month()),
+        ),
+    ]
+    for method_name in [
+        'has_limit_of_orders',
+        'has_active_order',
+        'get_active_order',
+        'has_in_work_order',
+        'has_closed_orders',
+        'get_contractors',
+        'get_not_assigned_contractors',
+    ]:
+        cases.append(
+            BenchmarkCase(
+                f'Client.{method_name} x{len(clients)}',
+                lambda method_name=method_name: call_for_every(clients, method_name),
+            )
+        )
+    for method_name in ['has_order_in_work', 'get_closed_in_actual_billing_orders']:
+        cases.append(
+            BenchmarkCase(
+                f'Contractor.{method_name} x{len(contractors)}',
+                lambda method_name=method_name: call_for_every(contractors, method_name),
+            )
+        )
+    return cases
+
+
+def measure(case: BenchmarkCase, repeat: int) -> dict[str, Any]:
+    """Замерить время выполнения и число запросов к БД"""
+    timings = []
+    queries_count = 0
+    for _ in range(repeat):
+        if case.setup is not None:
+            case.setup()
+        # системные параметры кешируются в процессе, их чтение не должно попадать в замер
+        system_settings.get('BILLING_DAY')
+        with CaptureQueriesContext(connection) as queries:
+            started_at = time.perf_counter()
+            case.run()
+            timings.append(time.perf_counter() - started_at)
+        queries_count = len(queries)
+    return {
+        'median_seconds': statistics.median(timings),
+        'min_seconds': min(timings),
+        'max_seconds': max(timings),
+        'queries': queries_count,
+    }
+
+
+def run_benchmarks(repeat: int) -> dict[str, dict[str, Any]]:
+    return {case.name: measure(case, repeat) for case in get_cases()}
+
+
+def compare_results(
+        baseline: dict[str, dict[str, dict[str, Any]]],
+        results: dict[str, dict[str, dict[str, Any]]],
+        threshold: float,
+) -> list[str]:
+    """Найти регрессии: медиана выросла больше чем в threshold раз или стало больше запросов"""
+    regressions = []
+    for size, cases in results.items():
+        for name, result in cases.items():
+            baseline_result = baseline.get(size, {}).get(name)
+            if baseline_result is None:
+                continue
+            ratio = result['median_seconds'] / max(baseline_result['median_seconds'], 1e-9)
+            if ratio > threshold:
+                regressions.append(f'{size} {name}: {ratio:.2f}x slower')
+            if result['queries'] > baseline_result['queries']:
+                regressions.append(
+                    f'{size} {name}: {baseline_result["queries"]} -> {result["queries"]} queries'
+                )
+    return regressions
+
+
+def run_order_lifecycle(client: Client, contractor: Contractor, task_number: int) -> None:
+    """Путь заказа в боте: создание с проверкой лимита, взятие в работу и закрытие"""
+    if task_number % USAGE_RESET_ORDERS == 0:
+        ClientBillingUsage.objects.filter(client=client).update(orders_count=0)
+    order = Order.objects.create_within_limit(client, task=f'benchmark{task_number}')
+    Order.objects.claim(order.pk, contractor, 1)
+    order.refresh_from_db()
+    order.close_work()
+
+
+def run_operation_worker(
+        operation: Callable[[int], Any],
+        deadline: float,
+        timings: list[float],
+        errors: list[str],
+) -> None:
+    """Выполнять операцию в своем соединении с БД до deadline, ошибки БД считаются отдельно"""
+    try:
+        iteration = 0
+        while time.perf_counter() < deadline:
+            started_at = time.perf_counter()
+            try:
+                operation(iteration)
+            except DatabaseError as exc:
+                errors.append(str(exc))
+            else:
+                timings.append(time.perf_counter() - started_at)
+            iteration += 1
+    finally:
+        connection.close()
+
+
+def run_workers(operations: list[Callable[[int], Any]], seconds: float) -> tuple[list[list[float]], list[str], float]:
+    """Выполнять операции параллельно, каждую в своем потоке, вернуть время операций по потокам и ошибки"""
+    timings_by_thread = [[] for _ in operations]
+    errors = []
+    deadline = time.perf_counter() + seconds
+    workers = [
+        threading.Thread(target=run_operation_worker, args=(operation, deadline, timings, errors))
+        for operation, timings in zip(operations, timings_by_thread)
+    ]
+    started_at = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return timings_by_thread, errors, time.perf_counter() - started_at
+
+
+def get_throughput(timings_by_thread: list[list[float]], elapsed: float) -> dict[str, Any]:
+    timings = sorted(timing for thread_timings in timings_by_thread for timing in thread_timings)
+    return {
+        'operations': len(timings),
+        'operations_per_second': len(timings) / elapsed,
+        'median_seconds': statistics.median(timings) if timings else None,
+        'p95_seconds': timings[int(len(timings) * 0.95)] if timings else None,
+    }
+
+
+def measure_throughput(threads: int, seconds: float) -> dict[str, Any]:
+    """
+    Пропускная способность БД на пути заказа: каждый поток создает, берет в работу и закрывает заказы
+    своего клиента и подрядчика
+    """
+    clients = list(Client.objects.order_by('pk')[:threads])
+    contractors = list(Contractor.objects.order_by('pk')[:threads])
+    if len(clients) < threads or len(contractors) < threads:
+        raise ValueError(f'At least {threads} clients and contractors are required')
+    # лимит тарифа не должен останавливать бенчмарк
+    Tariff.objects.filter(pk__in={client.tariff_id for client in clients}).update(orders_limit=MAX_ORDERS_LIMIT)
+
+    timings_by_thread, errors, elapsed = run_workers(
+        [partial(run_order_lifecycle, client, contractor) for client, contractor in zip(clients, contractors)],
+        seconds,
+    )
+    return {**get_throughput(timings_by_thread, elapsed), 'errors': len(errors)}
+
+
+def read_client_orders(client: Client, iteration: int) -> None:
+    """Чтения бота: заказы клиента и страница доступных заказов"""
+    list(client.orders.order_by('-created_at')[:20])
+    Order.objects.get_available_page(5)
+
+
+def write_bot_state(client: Client, iteration: int) -> None:
+    """Запись бота: сохранение состояния пользователя на каждое обновление"""
+    client.bot_state = f'STATE{iteration}'
+    client.save(update_fields=['bot_state'])
+
+
+def measure_read_write_throughput(readers: int, writers: int, seconds: float) -> dict[str, Any]:
+    """Пропускная способность параллельных чтений и записей, каждый поток работает со своим клиентом"""
+    clients = list(Client.objects.order_by('pk')[:readers + writers])
+    if len(clients) < readers + writers:
+        raise ValueError(f'At least {readers + writers} clients are required')
+    operations = [partial(read_client_orders, client) for client in clients[:readers]]
+    operations += [partial(write_bot_state, client) for client in clients[readers:]]
+
+    timings_by_thread, errors, elapsed = run_workers(operations, seconds)
+    return {
+        'reads': get_throughput(timings_by_thread[:readers], elapsed),
+        'writes': get_throughput(timings_by_thread[readers:], elapsed),
+        'errors': len(errors),
+    }
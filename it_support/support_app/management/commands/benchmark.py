@@ -0,0 +1,107 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from support_app.benchmarks import compare_results
+from support_app.benchmarks import run_benchmarks
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = "Benchmark order queries and bot users predicates on generated test databases of several sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10000,100000,1000000',
+            help='Comma separated numbers of orders, a database is generated for every size',
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of every benchmark, median is compared')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1, help='Processes which generate orders')
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--compare', help='JSON file of previous run to compare with')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=1.5,
+            help='Slowdown of median which is reported as regression',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('Sizes should be comma separated integers')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf8') as f:
+                baseline = json.load(f)['results']
+
+        # benchmark never touches working database
+        old_database_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        results = {}
+        try:
+            for size in sizes:
+                self.stdout.write(f'Generating {size} orders')
+                call_command('delete_test_data')
+                call_command(
+                    'fill_test_data',
+                    orders=size,
+                    clients=max(10, size // 1000),
+                    contractors=max(10, size // 5000),
+                    days=365,
+                    seed=options['seed'],
+                    workers=options['workers'],
+                    stdout=self.stdout,
+                    stderr=self.stderr,
+                )
+                results[str(size)] = run_benchmarks(options['repeat'])
+                for name, result in results[str(size)].items():
+                    self.stdout.write(
+                        f'{size:>9} {name:<60} {result["median_seconds"] * 1000:10.2f} ms '
+                        f'{result["queries"]:6} queries'
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        report = {
+            'meta': {
+                'commit': get_git_commit(),
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if baseline is not None:
+            regressions = compare_results(baseline, results, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions found:\n' + '\n'.join(regressions))
+            self.stdout.write('No regressions found')
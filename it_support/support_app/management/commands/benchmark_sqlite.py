@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from support_app.benchmarks import measure_read_write_throughput
+
+# настройки SQLite по умолчанию, journal_mode хранится в файле БД, поэтому возвращается явно
+SQLITE_DEFAULT_PRAGMAS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'mmap_size': 0,
+    'cache_size': -2000,
+    'temp_store': 'default',
+}
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent reads and writes throughput of SQLite with default settings and SQLITE_PRAGMAS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Threads which read orders')
+        parser.add_argument('--writers', type=int, default=2, help='Threads which save bot states')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of every run')
+        parser.add_argument('--orders', type=int, default=10000, help='Closed orders in database before runs')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Database is not SQLite')
+        threads = options['readers'] + options['writers']
+
+        # file of test database and its WAL files are removed with directory
+        tmp_dir = tempfile.mkdtemp(prefix='benchmark_sqlite')
+        if not connection.settings_dict['TEST']['NAME']:
+            # pragmas of in memory database differ from file one
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmp_dir) / 'benchmark_sqlite.sqlite3')
+        old_database_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            call_command(
+                'fill_test_data',
+                orders=options['orders'],
+                clients=max(10, threads),
+                stdout=self.stdout,
+                stderr=self.stderr,
+            )
+            for profile, pragmas in [('default', SQLITE_DEFAULT_PRAGMAS), ('tuned', settings.SQLITE_PRAGMAS)]:
+                with override_settings(SQLITE_PRAGMAS=pragmas):
+                    # pragmas are applied to new connections
+                    connection.close()
+                    result = measure_read_write_throughput(
+                        options['readers'],
+                        options['writers'],
+                        options['seconds'],
+                    )
+                self.stdout.write(
+                    f'{profile:<8} {result["reads"]["operations_per_second"]:10.1f} reads/s '
+                    f'{result["writes"]["operations_per_second"]:10.1f} writes/s {result["errors"]:6} errors'
+                )
+        finally:
+            connection.close()
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,89 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from support_app.benchmarks import measure_throughput
+from support_app.management.commands.benchmark import get_git_commit
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure order lifecycles per second of configured database on several threads, "
+        "run it with SQLite and PostgreSQL DATABASE_URL and compare"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,4,16', help='Comma separated numbers of concurrent threads')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of every run')
+        parser.add_argument('--orders', type=int, default=10000, help='Closed orders in database before runs')
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--compare', help='JSON file of run on another database to compare with')
+
+    def handle(self, *args, **options):
+        try:
+            threads_counts = sorted(int(threads) for threads in options['threads'].split(','))
+        except ValueError:
+            raise CommandError('Threads should be comma separated integers')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf8') as f:
+                baseline = json.load(f)
+
+        # file of test database and its WAL files are removed with directory
+        tmp_dir = tempfile.mkdtemp(prefix='benchmark_throughput')
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # in memory test database hides the cost of writes to disk
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmp_dir) / 'benchmark_throughput.sqlite3')
+        old_database_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        results = {}
+        try:
+            call_command(
+                'fill_test_data',
+                orders=options['orders'],
+                clients=max(10, threads_counts[-1]),
+                contractors=max(10, threads_counts[-1]),
+                open_orders=0,
+                stdout=self.stdout,
+                stderr=self.stderr,
+            )
+            for threads in threads_counts:
+                result = measure_throughput(threads, options['seconds'])
+                results[str(threads)] = result
+                self.stdout.write(
+                    f'{threads:>4} threads {result["operations_per_second"]:10.1f} lifecycles/s '
+                    f'{result["errors"]:6} errors'
+                )
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        report = {
+            'meta': {
+                'commit': get_git_commit(),
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'seconds': options['seconds'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if baseline is not None:
+            for threads, result in results.items():
+                baseline_result = baseline['results'].get(threads)
+                if baseline_result is None:
+                    continue
+                ratio = result['operations_per_second'] / max(baseline_result['operations_per_second'], 1e-9)
+                self.stdout.write(
+                    f'{threads:>4} threads: {connection.vendor} is {ratio:.2f}x of {baseline["meta"]["database"]}'
+                )
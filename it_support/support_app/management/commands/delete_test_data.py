@@ -1,17 +1,24 @@
 from django.core.management.base import BaseCommand
 
+from support_app.models import AssignedContractor
+from support_app.models import ClientBillingUsage
 from support_app.models import Order
 from support_app.models import Client
 from support_app.models import Manager
 from support_app.models import Contractor
 from support_app.models import Tariff
+from support_app.models import OrderMonthlyStat
 
 
 class Command(BaseCommand):
-    help = "Create test orders"
+    help = "Delete test data created by fill_test_data"
 
     def handle(self, *args, **kwargs):
         Order.objects.filter(task__startswith='test').delete()
+        # statistics contains test orders too, it will be rebuilt at next report
+        OrderMonthlyStat.objects.all().delete()
+        ClientBillingUsage.objects.filter(client__tg_nick__startswith='test').delete()
+        AssignedContractor.objects.filter(client__tg_nick__startswith='test').delete()
         Client.objects.filter(tg_nick__startswith='test').delete()
         Manager.objects.filter(tg_nick__startswith='test').delete()
         Contractor.objects.filter(tg_nick__startswith='test').delete()
@@ -1,87 +1,73 @@
-import random
-from decimal import Decimal
-
 from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
 from django.utils import timezone
 
-from support_app.models import Order
-from support_app.models import BotUser
-from support_app.models import Client
-from support_app.models import Manager
-from support_app.models import Contractor
-from support_app.models import Tariff
+from support_app.test_data import create_history_orders
+from support_app.test_data import create_open_orders
+from support_app.test_data import create_tariffs
+from support_app.test_data import create_users
 
 
 class Command(BaseCommand):
-    help = "Create test orders"
+    help = "Create test tariffs, clients, contractors and orders, the same seed gives the same data"
 
-    def handle(self, *args, **kwargs):
-        tariff_1 = Tariff(
-            name='test1',
-            orders_limit=5,
-            reaction_time_minutes=1440,
-            can_reserve_contractor=False,
-            can_see_contractor_contacts=False,
-            price=Decimal(4000)
-        )
-        tariff_2 = Tariff(
-            name='test2',
-            orders_limit=15,
-            reaction_time_minutes=1440,
-            can_reserve_contractor=False,
-            can_see_contractor_contacts=False,
-            price=Decimal(10000)
+    def add_arguments(self, parser):
+        parser.add_argument('--tariffs', type=int, default=3, help='Number of tariffs')
+        parser.add_argument('--clients', type=int, default=10, help='Number of clients')
+        parser.add_argument('--contractors', type=int, default=10, help='Number of contractors')
+        parser.add_argument('--orders', type=int, default=400, help='Number of closed and cancelled orders')
+        parser.add_argument(
+            '--open-orders',
+            type=int,
+            default=None,
+            help='Number of created and in work orders, a tenth of clients by default',
         )
-        tariff_3 = Tariff(
-            name='test3',
-            orders_limit=50,
-            reaction_time_minutes=60,
-            can_reserve_contractor=True,
-            can_see_contractor_contacts=True,
-            price=Decimal(25000)
+        parser.add_argument('--days', type=int, default=200, help='Orders history length in days')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Orders in one bulk insert')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes which generate orders, SQLite allows only one writer so it always uses one process',
         )
-        tariff_1.save()
-        tariff_2.save()
-        tariff_3.save()
 
-        for i in range(10):
-            client = Client(
-                tg_nick=f'testclient{i}',
-                role=BotUser.Role.client,
-                status=BotUser.Status.active if i != 1 else BotUser.Status.inactive,
-                tariff=random.choice([tariff_1, tariff_2, tariff_3]),
-                paid=True if i != 0 else False,
-            )
-            contractor = Contractor(
-                tg_nick=f'testcontractor{i}',
-                role=BotUser.Role.contractor,
-                status=BotUser.Status.active if i != 1 else BotUser.Status.inactive,
-            )
-            client.save()
-            contractor.save()
-        clients = Client.objects.filter(tg_nick__startswith='test')
-        contractors = Contractor.objects.filter(tg_nick__startswith='test')
+    def handle(self, *args, **options):
+        if options['tariffs'] < 1:
+            raise CommandError('At least one tariff is required')
+        if options['batch_size'] < 1:
+            raise CommandError('Batch size should be positive')
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stderr.write('SQLite allows only one writer, orders are generated in one process')
+            workers = 1
 
         now = timezone.now()
-        created_at = now - timezone.timedelta(days=200)
-        assigned_at = created_at + timezone.timedelta(minutes=random.randint(1, 1440))
-        closed_at = assigned_at + timezone.timedelta(minutes=random.randint(1, 1440))
-        task_number = 0
-        while closed_at < now:
-            order = Order(
-                task=f'testtask{task_number}',
-                client=random.choice(clients),
-                contractor=random.choice(contractors),
-                created_at=created_at,
-                assigned_at=assigned_at,
-                closed_at=closed_at,
-                status=Order.Status.closed,
-                in_work_client_informed=True,
-                closed_client_informed=True,
-                creds=f'testcreds{task_number}',
-                estimated_hours=random.randint(1, 24),
-            )
-            order.save()
-            created_at = created_at + timezone.timedelta(minutes=random.randint(1, 1440))
-            assigned_at = created_at + timezone.timedelta(minutes=random.randint(1, 1440))
-            closed_at = assigned_at + timezone.timedelta(minutes=random.randint(1, 1440))
+        tariffs = create_tariffs(options['tariffs'])
+        clients, contractors = create_users(options['seed'], options['clients'], options['contractors'], tariffs)
+        history_orders_count = create_history_orders(
+            seed=options['seed'],
+            orders_count=options['orders'],
+            days=options['days'],
+            clients=clients,
+            contractors=contractors,
+            batch_size=options['batch_size'],
+            workers=workers,
+            now=now,
+        )
+        open_orders_count = options['open_orders']
+        if open_orders_count is None:
+            open_orders_count = max(1, len(clients) // 10)
+        open_orders_count = create_open_orders(
+            seed=options['seed'],
+            orders_count=open_orders_count,
+            first_task_number=options['orders'],
+            clients=clients,
+            contractors=contractors,
+            now=now,
+        )
+        self.stdout.write(
+            f'Created {len(tariffs)} tariffs, {len(clients)} clients, {len(contractors)} contractors, '
+            f'{history_orders_count} closed and cancelled orders, {open_orders_count} open orders'
+        )
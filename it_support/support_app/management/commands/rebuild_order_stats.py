@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from support_app.models import OrderMonthlyStat
+from support_app.models import get_nearest_billing_start_date
+from support_app.system_settings import system_settings
+
+
+class Command(BaseCommand):
+    help = "Rebuild monthly orders statistics of closed billings"
+
+    def handle(self, *args, **kwargs):
+        OrderMonthlyStat.objects.all().delete()
+        OrderMonthlyStat.objects.roll_up(
+            system_settings.get('BILLING_DAY'),
+            get_nearest_billing_start_date(),
+        )
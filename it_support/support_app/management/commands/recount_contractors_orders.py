@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from support_app.models import Contractor
+
+
+class Command(BaseCommand):
+    help = "Recount orders in work of contractors from orders table"
+
+    def handle(self, *args, **kwargs):
+        updated_count = Contractor.objects.recount_in_work_orders()
+        self.stdout.write(f'Recounted orders in work of {updated_count} contractors')
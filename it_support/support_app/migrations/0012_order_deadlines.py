@@ -0,0 +1,54 @@
+# Generated by Django 4.1.13 on 2026-10-18 18:49
+
+import datetime
+
+from django.db import migrations, models
+
+
+def fill_deadlines(apps, schema_editor):
+    Order = apps.get_model('support_app', 'Order')
+    default_estimated_hours = 24
+    orders = Order.objects.select_related('client__tariff').only(
+        'created_at',
+        'assigned_at',
+        'estimated_hours',
+        'client__tariff__reaction_time_minutes',
+    )
+    for order in orders.iterator(chunk_size=2000):
+        order.reaction_deadline = order.created_at + datetime.timedelta(
+            minutes=order.client.tariff.reaction_time_minutes
+        )
+        if order.assigned_at is not None:
+            order.completion_deadline = order.assigned_at + datetime.timedelta(
+                hours=order.estimated_hours or default_estimated_hours
+            )
+        order.save(update_fields=['reaction_deadline', 'completion_deadline'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support_app', '0011_alter_assignedcontractor_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='completion_deadline',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='крайний срок выполнения'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='reaction_deadline',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='крайний срок взятия в работу'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'reaction_deadline'], name='order_status_reaction_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'completion_deadline'], name='order_status_completion_idx'),
+        ),
+        migrations.RunPython(fill_deadlines, migrations.RunPython.noop),
+    ]
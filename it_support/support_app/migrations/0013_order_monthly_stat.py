@@ -0,0 +1,36 @@
+# Generated by Django 4.1.13 on 2026-10-18 18:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support_app', '0012_order_deadlines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderMonthlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('billing_day', models.PositiveSmallIntegerField(verbose_name='день биллинга')),
+                ('billing_start_date', models.DateTimeField(verbose_name='начало биллинга')),
+                ('orders_count', models.PositiveIntegerField(verbose_name='число заказов')),
+                ('client', models.ForeignKey(blank=True, help_text='пустой клиент означает итог по всем клиентам', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='monthly_order_stats', to='support_app.client')),
+            ],
+            options={
+                'verbose_name': 'статистика заказов за биллинг',
+                'verbose_name_plural': 'статистика заказов за биллинги',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ordermonthlystat',
+            constraint=models.UniqueConstraint(fields=('billing_day', 'billing_start_date', 'client'), name='order_monthly_stat_unique_client'),
+        ),
+        migrations.AddConstraint(
+            model_name='ordermonthlystat',
+            constraint=models.UniqueConstraint(condition=models.Q(('client__isnull', True)), fields=('billing_day', 'billing_start_date'), name='order_monthly_stat_unique_total'),
+        ),
+    ]
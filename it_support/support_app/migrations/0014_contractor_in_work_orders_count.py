@@ -0,0 +1,31 @@
+# Generated by Django 4.1.13 on 2026-10-18 19:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_in_work_orders_count(apps, schema_editor):
+    Contractor = apps.get_model('support_app', 'Contractor')
+    Order = apps.get_model('support_app', 'Order')
+    in_work_orders_count = Order.objects.filter(
+        status='в работе',
+        contractor=OuterRef('pk'),
+    ).values('contractor').annotate(count=Count('id')).values('count')
+    Contractor.objects.update(in_work_orders_count=Coalesce(Subquery(in_work_orders_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support_app', '0013_order_monthly_stat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contractor',
+            name='in_work_orders_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='число заказов в работе'),
+        ),
+        migrations.RunPython(fill_in_work_orders_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.13 on 2026-10-18 19:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support_app', '0014_contractor_in_work_orders_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientBillingUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('billing_start_date', models.DateTimeField(verbose_name='начало биллинга')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='число созданных заказов')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='billing_usages', to='support_app.client')),
+            ],
+            options={
+                'verbose_name': 'использование тарифа за биллинг',
+                'verbose_name_plural': 'использование тарифов за биллинги',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='clientbillingusage',
+            constraint=models.UniqueConstraint(fields=('client', 'billing_start_date'), name='client_billing_usage_unique'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import Q
+
+# Открытых заказов мало по сравнению с закрытыми, частичные индексы по ним маленькие и всегда в памяти.
+# Создаются только на PostgreSQL, SQLite не использует частичный индекс для условия с параметром
+OPEN_ORDERS_PARTIAL_INDEXES = [
+    models.Index(
+        fields=['created_at', 'id'],
+        condition=Q(status='создан'),
+        name='order_created_queue_idx',
+    ),
+    models.Index(
+        fields=['reaction_deadline'],
+        condition=Q(status='создан'),
+        name='order_created_reaction_idx',
+    ),
+    models.Index(
+        fields=['completion_deadline'],
+        condition=Q(status='в работе'),
+        name='order_in_work_completion_idx',
+    ),
+]
+
+
+def add_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Order = apps.get_model('support_app', 'Order')
+    for index in OPEN_ORDERS_PARTIAL_INDEXES:
+        schema_editor.add_index(Order, index)
+
+
+def remove_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Order = apps.get_model('support_app', 'Order')
+    for index in OPEN_ORDERS_PARTIAL_INDEXES:
+        schema_editor.remove_index(Order, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support_app', '0016_order_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_partial_indexes, remove_partial_indexes),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations, models
+from django.db.models import Q
+
+from support_app.system_settings import SYSTEM_PARAMETERS
+
+# частичные индексы сроков из 0017 искали почти просроченные заказы, теперь их находит индекс по warn_at
+DEADLINE_PARTIAL_INDEXES = [
+    models.Index(
+        fields=['reaction_deadline'],
+        condition=Q(status='создан'),
+        name='order_created_reaction_idx',
+    ),
+    models.Index(
+        fields=['completion_deadline'],
+        condition=Q(status='в работе'),
+        name='order_in_work_completion_idx',
+    ),
+]
+
+WARNING_WINDOWS = {
+    'создан': ('INFORM_MANAGER_CREATED_PROJECT_LIMIT', 'created_at', 'reaction_deadline'),
+    'в работе': ('INFORM_MANAGER_IN_WORK_PROJECT_LIMIT', 'assigned_at', 'completion_deadline'),
+}
+
+
+def fill_warn_at(apps, schema_editor):
+    Order = apps.get_model('support_app', 'Order')
+    SystemSettings = apps.get_model('support_app', 'SystemSettings')
+    raw_values = dict(SystemSettings.objects.values_list('parameter_name', 'parameter_value'))
+    for status, (limit_name, start_field, deadline_field) in WARNING_WINDOWS.items():
+        limit = SYSTEM_PARAMETERS[limit_name].parse(raw_values.get(limit_name))
+        orders = Order.objects.filter(status=status).only(start_field, deadline_field)
+        for order in orders.iterator(chunk_size=2000):
+            start, deadline = getattr(order, start_field), getattr(order, deadline_field)
+            if start is None or deadline is None:
+                continue
+            order.warn_at = deadline - (deadline - start) * round(1 - limit, 4)
+            order.save(update_fields=['warn_at'])
+
+
+def remove_deadline_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Order = apps.get_model('support_app', 'Order')
+    for index in DEADLINE_PARTIAL_INDEXES:
+        schema_editor.remove_index(Order, index)
+
+
+def add_deadline_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Order = apps.get_model('support_app', 'Order')
+    for index in DEADLINE_PARTIAL_INDEXES:
+        schema_editor.add_index(Order, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support_app', '0017_order_open_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='warn_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='момент предупреждения менеджеров'),
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_status_reaction_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_status_completion_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'warn_at'], name='order_status_warn_idx'),
+        ),
+        migrations.RunPython(remove_deadline_partial_indexes, add_deadline_partial_indexes),
+        migrations.RunPython(fill_warn_at, migrations.RunPython.noop),
+    ]
@@ -1,30 +1,70 @@
 from django.core.validators import MinLengthValidator, RegexValidator, MinValueValidator, MaxValueValidator
+from django.conf import settings
+from django.db import connection
 from django.db import models
-from django.db.models import Min, Count
+from django.db.models import Min, Max, Count, F, Q, Func, Value, ExpressionWrapper, DurationField, DateTimeField
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncMonth
 from django.db.transaction import atomic
+from django.db.transaction import on_commit
 from django.utils import timezone
 from dateutil import relativedelta
 
+from support_app.signals import order_created
+from support_app.signals import order_status_changed
+from support_app.system_settings import system_settings
+
+
+class ScaleDuration(Func):
+    """Умножить интервал на число, результатом остается интервал"""
+    template = '(%(expressions)s)'
+    arg_joiner = ' * '
+    output_field = DurationField()
+
+    def __init__(self, duration, factor: float, **extra):
+        super().__init__(duration, Value(factor), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # в SQLite интервал хранится целым числом микросекунд и арифметика с датами ждет целое
+        return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS INTEGER)', **extra_context)
 
-def get_nearest_billing_start_date() -> timezone.datetime:
-    """Получить дату начала текущего биллинга"""
-    try:
-        billing_day = int(SystemSettings.objects.get('BILLING_DAY').parameter_value)
-    except (SystemSettings.DoesNotExist, ValueError):
-        billing_day = 1
 
-    now = timezone.now()
+def get_deadline_slack(start_field: str, deadline_field: str, limit: float) -> ScaleDuration:
+    """
+    Запас времени до крайнего срока, при котором пора предупреждать.
+
+    Это оставшаяся доля (1 - limit) окна от start_field до deadline_field,
+    заказ почти просрочен в момент deadline - slack
+    """
+    window = ExpressionWrapper(F(deadline_field) - F(start_field), output_field=DurationField())
+    return ScaleDuration(window, round(1 - limit, 4))
+
+
+def get_warn_at(start: timezone.datetime, deadline: timezone.datetime, limit: float) -> timezone.datetime:
+    """Момент, когда прошла доля limit окна от start до deadline, то же что и deadline - get_deadline_slack"""
+    return deadline - (deadline - start) * round(1 - limit, 4)
+
+
+def get_billing_start_date(date: timezone.datetime, billing_day: int) -> timezone.datetime:
+    """Получить дату начала биллинга, в который попадает дата"""
+    local_date = timezone.localtime(date)
     billing_date = timezone.datetime(
-        year=now.year,
-        month=now.month,
+        year=local_date.year,
+        month=local_date.month,
         day=billing_day,
         tzinfo=timezone.get_current_timezone()
     )
-    if billing_date > now:
+    if billing_date > local_date:
         return billing_date - relativedelta.relativedelta(months=1)
     return billing_date
 
 
+def get_nearest_billing_start_date() -> timezone.datetime:
+    """Получить дату начала текущего биллинга"""
+    billing_day = system_settings.get('BILLING_DAY')
+    return get_billing_start_date(timezone.now(), billing_day)
+
+
 class BotUserQuerySet(models.QuerySet):
     def active(self):
         """Активные пользователи бота"""
@@ -110,11 +150,22 @@ class Client(BotUser):
     def has_limit_of_orders(self):
         """Имеет ли лимит для заказов в этом месяце"""
         nearest_billing_start_date = get_nearest_billing_start_date()
-
-        created_orders_count = self.orders.filter(created_at__gte=nearest_billing_start_date).count()
-        can_create_orders_count = self.tariff.orders_limit
-
-        return can_create_orders_count > created_orders_count
+        usage_orders_count = ClientBillingUsage.objects.filter(
+            client=OuterRef('pk'),
+            billing_start_date=nearest_billing_start_date,
+        ).values('orders_count')
+        # счетчика еще нет если в этом биллинге не создавали заказов через бота, тогда считаем по заказам
+        created_orders_count = Order.objects.filter(
+            client=OuterRef('pk'),
+            created_at__gte=nearest_billing_start_date,
+        ).values('client').annotate(count=Count('id')).values('count')
+
+        return Client.objects.annotate(
+            billing_orders_count=Coalesce(Subquery(usage_orders_count), Subquery(created_orders_count), 0),
+        ).filter(
+            pk=self.pk,
+            tariff__orders_limit__gt=F('billing_orders_count'),
+        ).exists()
 
     def has_active_order(self):
         """Есть ли активный заказ"""
@@ -148,7 +199,7 @@ class Client(BotUser):
 
     def get_not_assigned_contractors(self):
         """Получить всех не закрепленных свободных подрядчиков"""
-        assigned_contractors_ids = [contractor.pk for contractor in self.contractors.all()]
+        assigned_contractors_ids = self.contractors.values('contractor')
         return Contractor.objects.active().get_available().exclude(pk__in=assigned_contractors_ids)
 
     def has_closed_orders(self):
@@ -176,30 +227,59 @@ class Client(BotUser):
 class ContractorQuerySet(BotUserQuerySet):
     def get_available(self):
         """Получить свободных подрядчиков"""
-        not_available_contractors = Order.objects.select_related('contractor').filter(
-            status=Order.Status.in_work).values('contractor').distinct()
-        not_available_contractor_ids = [contractor['contractor'] for contractor in not_available_contractors]
-        return self.active().exclude(id__in=not_available_contractor_ids)
+        return self.active().filter(in_work_orders_count=0)
+
+    def recount_in_work_orders(self):
+        """Пересчитать число заказов в работе по заказам, возвращает число обновленных подрядчиков"""
+        in_work_orders_count = Order.objects.filter(
+            status=Order.Status.in_work,
+            contractor=OuterRef('pk'),
+        ).values('contractor').annotate(count=Count('id')).values('count')
+        return self.update(in_work_orders_count=Coalesce(Subquery(in_work_orders_count), 0))
+
+    def add_in_work_orders(self, count: int):
+        """Изменить число заказов в работе на count без чтения, безопасно при параллельных изменениях"""
+        return self.update(in_work_orders_count=F('in_work_orders_count') + count)
 
 
 class Contractor(BotUser):
+    # поддерживается при взятии, закрытии и отмене заказа, чтобы свободных подрядчиков искать одним фильтром
+    in_work_orders_count = models.PositiveIntegerField('число заказов в работе', default=0, db_index=True)
+
     objects = ContractorQuerySet.as_manager()
 
     def delete_from_bot(self):
-        """Удалить подрядчика из бота, освободив его заказы"""
-        contractor_orders = Order.objects.filter(status=Order.Status.in_work, contractor=self)
+        """
+        Удалить подрядчика из бота, освободив его заказы.
+
+        Освобожденные заказы снова ждут взятия в работу, момент предупреждения считается по сроку реакции,
+        после коммита по каждому отправляется order_status_changed
+        """
+        # заказы читаются до транзакции, чтобы SQLite сразу брал блокировку на запись
+        orders_pks = list(
+            Order.objects.filter(status=Order.Status.in_work, contractor=self).values_list('pk', flat=True)
+        )
         with atomic():
+            contractor_orders = Order.objects.filter(pk__in=orders_pks, status=Order.Status.in_work, contractor=self)
             contractor_orders.update(
                 status=Order.Status.created,
                 assigned_at=None,
                 contractor=None,
                 not_in_work_manager_informed=False,
                 late_work_manager_informed=False,
-                in_work_client_informed=False,
                 estimated_hours=None,
+                completion_deadline=None,
             )
+            Order.objects.filter(pk__in=orders_pks, status=Order.Status.created).recalculate_warn_at()
             self.status = BotUser.Status.inactive
+            self.in_work_orders_count = 0
             self.save()
+            on_commit(lambda: self.send_released_orders_changed(orders_pks))
+
+    @staticmethod
+    def send_released_orders_changed(orders_pks):
+        for order in Order.objects.filter(pk__in=orders_pks, status=Order.Status.created):
+            order_status_changed.send(sender=Order, order=order)
 
     def has_order_in_work(self):
         """Есть ли заказ в работе"""
@@ -267,98 +347,220 @@ class AssignedContractor(models.Model):
 class OrderQuerySet(models.QuerySet):
     def get_warning_orders_not_in_work(self):
         """Получить список новых заказов, которые почти просрочили (долго не берут в работу)"""
-        orders_not_in_work = self.select_related('client').filter(
+        return self.select_related('client').filter(
             status=Order.Status.created,
             not_in_work_manager_informed=False,
+            warn_at__lte=timezone.now(),
         )
-        warning_orders_ids = []
-        tariffs = Tariff.objects.all()
-
-        try:
-            limit = SystemSettings.objects.get('INFORM_MANAGER_CREATED_PROJECT_LIMIT').parameter_value
-            limit = int(limit) / 100
-        except (SystemSettings.DoesNotExist, ValueError):
-            limit = 0.95
-
-        # TODO: написать через аннотейты
-        for tariff in tariffs:
-            tariff_orders = orders_not_in_work.filter(client__tariff=tariff)
-            for tariff_order in tariff_orders:
-                not_in_work_time = timezone.now() - tariff_order.created_at
-                tariff_limit_seconds = tariff.reaction_time_minutes * 60
-                if not_in_work_time.total_seconds() / tariff_limit_seconds > limit:
-                    warning_orders_ids.append(tariff_order.pk)
-        return self.filter(pk__in=warning_orders_ids)
 
     def get_warning_orders_not_closed(self):
         """Получить список выполняющихся заказов, которые почти просрочили (долго выполняют)"""
-        orders_not_closed = self.select_related('client', 'contractor').filter(
+        return self.select_related('client', 'contractor').filter(
             status=Order.Status.in_work,
             late_work_manager_informed=False,
+            warn_at__lte=timezone.now(),
         )
-        warning_orders_ids = []
 
-        try:
-            limit = SystemSettings.objects.get('INFORM_MANAGER_IN_WORK_PROJECT_LIMIT').parameter_value
-            limit = int(limit) / 100
-        except (SystemSettings.DoesNotExist, ValueError):
-            limit = 0.95
+    def recalculate_warn_at(self):
+        """Пересчитать момент предупреждения открытых заказов, нужно после изменения порогов предупреждения"""
+        for status, (limit_name, start_field, deadline_field) in Order.WARNING_WINDOWS.items():
+            limit = system_settings.get(limit_name)
+            self.filter(status=status).update(
+                warn_at=ExpressionWrapper(
+                    F(deadline_field) - get_deadline_slack(start_field, deadline_field, limit),
+                    output_field=DateTimeField(),
+                ),
+            )
+
+    def get_not_warned_open_orders(self):
+        """Получить открытые заказы, о которых еще не предупреждали менеджеров"""
+        return self.filter(
+            Q(status=Order.Status.created, not_in_work_manager_informed=False)
+            | Q(status=Order.Status.in_work, late_work_manager_informed=False)
+        ).only(
+            'status',
+            'warn_at',
+            'not_in_work_manager_informed',
+            'late_work_manager_informed',
+        )
 
-        for order in orders_not_closed:
-            not_closed_time = timezone.now() - order.assigned_at
-            limit_seconds = 60 * 60 * 24  # TODO: добавить эстимейты
-            if not_closed_time.total_seconds() / limit_seconds > limit:
-                warning_orders_ids.append(order.pk)
-        return self.filter(pk__in=warning_orders_ids)
+    def create_within_limit(self, client, **fields):
+        """
+        Создать заказ клиента, если в текущем биллинге не исчерпан лимит тарифа, иначе вернуть None.
+
+        Счетчик заказов биллинга увеличивается условным UPDATE в той же транзакции,
+        поэтому два параллельных заказа не могут оба пройти проверку лимита.
+        После коммита отправляется сигнал order_created
+        """
+        nearest_billing_start_date = get_nearest_billing_start_date()
+        usage = ClientBillingUsage.objects.get_or_create_for_period(client, nearest_billing_start_date)
+        # транзакция начинается с записи, чтобы SQLite сразу брал блокировку на запись, а не повышал ее после чтения
+        with atomic():
+            is_counted = ClientBillingUsage.objects.filter(
+                pk=usage.pk,
+                orders_count__lt=F('client__tariff__orders_limit'),
+            ).update(orders_count=F('orders_count') + 1)
+            if not is_counted:
+                return None
+            order = self.create(client=client, **fields)
+            on_commit(lambda: order_created.send(sender=Order, order=order))
+        return order
 
     def get_available(self):
         """Получить список заказов, которые можно взять в работу"""
         return self.filter(status=Order.Status.created).order_by('created_at')
 
+    def get_available_page(self, size: int, after: tuple = None, before: tuple = None):
+        """
+        Получить страницу доступных заказов с пагинацией по ключу (created_at, id).
+
+        after и before - ключ последнего заказа предыдущей или первого заказа следующей страницы.
+        Запрашивается на один заказ больше страницы, чтобы узнать есть ли еще заказы в этом направлении,
+        возвращает заказы страницы и признак что они есть
+        """
+        orders = self.get_available()
+        if before is not None:
+            created_at, pk = before
+            orders = orders.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk),
+            ).order_by('-created_at', '-pk')
+        else:
+            orders = orders.order_by('created_at', 'pk')
+            if after is not None:
+                created_at, pk = after
+                orders = orders.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+
+        page = list(orders[:size + 1])
+        has_more = len(page) > size
+        page = page[:size]
+        if before is not None:
+            page.reverse()
+        return page, has_more
+
     def get_available_not_informed_all(self):
         """Получить список заказов, которые можно взять в работу и по которым не проинформированы все подрядчики"""
         return self.get_available().filter(all_contractors_informed=False)
 
+    def claim(self, order_pk, contractor, estimated_hours) -> bool:
+        """
+        Атомарно взять заказ в работу.
+
+        Заказ меняется одним условным UPDATE только если он еще создан и без подрядчика,
+        возвращает True если заказ достался этому подрядчику
+        """
+        assigned_at = timezone.now()
+        completion_deadline = assigned_at + timezone.timedelta(hours=estimated_hours or Order.DEFAULT_ESTIMATED_HOURS)
+        claimed_orders = self.filter(pk=order_pk, status=Order.Status.created, contractor__isnull=True)
+        with atomic():
+            if settings.ORDER_CLAIM_SKIP_LOCKED and connection.features.has_select_for_update_skip_locked:
+                # заказ, который сейчас берет другой подрядчик, сразу считается занятым без ожидания блокировки
+                locked_orders = claimed_orders.select_for_update(skip_locked=True).values_list('pk', flat=True)
+                if not list(locked_orders):
+                    return False
+            claimed_count = claimed_orders.update(
+                contractor=contractor,
+                estimated_hours=estimated_hours,
+                assigned_at=assigned_at,
+                completion_deadline=completion_deadline,
+                warn_at=get_warn_at(
+                    assigned_at,
+                    completion_deadline,
+                    system_settings.get('INFORM_MANAGER_IN_WORK_PROJECT_LIMIT'),
+                ),
+                status=Order.Status.in_work,
+            )
+            if claimed_count:
+                Contractor.objects.filter(pk=contractor.pk).add_in_work_orders(1)
+        return claimed_count == 1
+
+    def count_by_billing_period(self, billing_day: int):
+        """
+        Получить число не отмененных заказов по биллингам и клиентам одним запросом.
+
+        Дата создания сдвигается на billing_day - 1 дней назад, тогда месяц сдвинутой даты
+        это месяц начала биллинга заказа
+        """
+        shifted_created_at = ExpressionWrapper(
+            F('created_at') - timezone.timedelta(days=billing_day - 1),
+            output_field=DateTimeField(),
+        )
+        return self.exclude(
+            status=Order.Status.cancelled,
+        ).annotate(
+            billing_month=TruncMonth(shifted_created_at),
+        ).values('billing_month', 'client').annotate(count_orders=Count('id')).order_by()
+
     def calculate_average_orders_in_month(self):
-        """Получить помесячную (финансовый месяц) статистику по заказам"""
+        """
+        Получить помесячную (финансовый месяц) статистику по заказам.
+
+        Закрытые биллинги берутся из OrderMonthlyStat и досчитываются туда по мере закрытия,
+        заново считается только текущий биллинг. Строки отдаются генератором, закрытые биллинги читаются
+        из БД частями по мере потребления
+        """
+        billing_day = system_settings.get('BILLING_DAY')
         nearest_billing_start_date = get_nearest_billing_start_date()
-        prev_billing_start_date = nearest_billing_start_date - relativedelta.relativedelta(months=1)
-
-        first_order_date = self.exclude(
-            status=Order.Status.cancelled
-        ).aggregate(dt=Min('created_at'))['dt']
+        yield from self.get_current_billing_stats(billing_day, nearest_billing_start_date)
+        yield from self.get_closed_billings_stats(billing_day, nearest_billing_start_date)
+
+    def get_billings_stats(
+            self,
+            billing_day: int,
+            from_billing_start_date: timezone.datetime,
+            to_billing_start_date: timezone.datetime,
+    ) -> list:
+        """
+        Посчитать статистику заказов по клиентам биллингов с from_billing_start_date до to_billing_start_date.
+
+        Биллинги идут от новых к старым, в каждом клиенты по нику и строка с итогом в конце
+        """
+        clients_stats_by_date = {}
+        for client_stat in self.filter(
+                created_at__gte=from_billing_start_date,
+                created_at__lt=to_billing_start_date,
+        ).count_by_billing_period(billing_day):
+            client_billing_start_date = client_stat['billing_month'] + timezone.timedelta(days=billing_day - 1)
+            clients_stats = clients_stats_by_date.setdefault(client_billing_start_date, {})
+            clients_stats[client_stat['client']] = client_stat['count_orders']
+        clients_nicks = dict(
+            Client.objects.filter(
+                pk__in={client_id for clients_stats in clients_stats_by_date.values() for client_id in clients_stats}
+            ).values_list('pk', 'tg_nick')
+        )
 
-        stats = []
-        while True:
-            total_orders_in_month = 0
-            clients_month_stat = self.exclude(
-                status=Order.Status.cancelled,
-            ).filter(
-                created_at__gt=prev_billing_start_date,
-                created_at__lte=prev_billing_start_date + relativedelta.relativedelta(months=1),
-            ).select_related('client__tg_nick').values('client__tg_nick').annotate(count_orders=Count('id'))
-
-            if prev_billing_start_date < first_order_date and not clients_month_stat:
-                break
-
-            for client_month_stat in clients_month_stat:
-                stats.append(
-                    [
-                        prev_billing_start_date,
-                        client_month_stat['client__tg_nick'],
-                        client_month_stat['count_orders']
-                    ]
+        rows = []
+        billing_start_date = to_billing_start_date - relativedelta.relativedelta(months=1)
+        while billing_start_date >= from_billing_start_date:
+            clients_stats = clients_stats_by_date.get(billing_start_date, {})
+            rows.extend(
+                [billing_start_date, clients_nicks[client_id], orders_count]
+                for client_id, orders_count in sorted(
+                    clients_stats.items(), key=lambda client_stat: clients_nicks[client_stat[0]]
                 )
-                total_orders_in_month += client_month_stat['count_orders']
-            stats.append(
-                [
-                    prev_billing_start_date,
-                    'Всего',
-                    total_orders_in_month
-                ]
             )
-            prev_billing_start_date -= relativedelta.relativedelta(months=1)
-        return stats
+            rows.append([billing_start_date, 'Всего', sum(clients_stats.values())])
+            billing_start_date -= relativedelta.relativedelta(months=1)
+        return rows
+
+    def get_current_billing_stats(self, billing_day: int, nearest_billing_start_date: timezone.datetime) -> list:
+        """Статистика заказов по клиентам текущего биллинга и строка с итогом"""
+        return self.get_billings_stats(
+            billing_day,
+            nearest_billing_start_date,
+            nearest_billing_start_date + relativedelta.relativedelta(months=1),
+        )
+
+    def get_closed_billings_stats(self, billing_day: int, nearest_billing_start_date: timezone.datetime):
+        """
+        Статистика заказов по клиентам закрытых биллингов, новые закрытые биллинги сначала досчитываются.
+
+        Биллинги, в которых еще есть незавершенные заказы, не досчитываются и считаются заново,
+        остальные закрытые биллинги не меняются, строки отдаются генератором.
+        Статистика общая и считается по всем заказам, а не по заказам этого QuerySet
+        """
+        rolled_up_until = OrderMonthlyStat.objects.roll_up(billing_day, nearest_billing_start_date)
+        yield from Order.objects.get_billings_stats(billing_day, rolled_up_until, nearest_billing_start_date)
+        yield from OrderMonthlyStat.objects.get_rolled_up_stats(billing_day, rolled_up_until)
 
     def calculate_billing(self):
         """Посчитать биллинг для подрядчиков за прошелший финансовый месяц"""
@@ -440,32 +642,116 @@ class Order(models.Model):
         default=False,
     )
 
-    objects = OrderQuerySet.as_manager()
-
-    def take_in_work(self, contractor, estimated_hours):
-        """Взять заказ в работу"""
-        with atomic():
-            self.contractor = contractor
-            self.estimated_hours = estimated_hours
-            self.assigned_at = timezone.now()
-            self.status = self.Status.in_work
-            self.save()
+    reaction_deadline = models.DateTimeField(
+        'крайний срок взятия в работу',
+        null=True,
+        blank=True,
+    )
+    completion_deadline = models.DateTimeField(
+        'крайний срок выполнения',
+        null=True,
+        blank=True,
+    )
+    # заранее посчитанный момент предупреждения менеджеров о текущем статусе,
+    # чтобы почти просроченные заказы находились диапазоном по индексу
+    warn_at = models.DateTimeField(
+        'момент предупреждения менеджеров',
+        null=True,
+        blank=True,
+    )
 
-    def close_work(self):
-        """Завершить заказ"""
-        with atomic():
-            self.closed_at = timezone.now()
-            self.status = self.Status.closed
-            self.creds = ''
-            self.save()
+    objects = OrderQuerySet.as_manager()
 
-    def cancel_work(self):
-        """Отменить заказ"""
+    DEFAULT_ESTIMATED_HOURS = 24
+    # статус: системный параметр с долей окна, после которой предупреждаются менеджеры, начало и конец окна
+    WARNING_WINDOWS = {
+        Status.created: ('INFORM_MANAGER_CREATED_PROJECT_LIMIT', 'created_at', 'reaction_deadline'),
+        Status.in_work: ('INFORM_MANAGER_IN_WORK_PROJECT_LIMIT', 'assigned_at', 'completion_deadline'),
+    }
+
+    def save(self, *args, **kwargs):
+        if self.reaction_deadline is None:
+            self.reaction_deadline = self.calculate_reaction_deadline()
+        if self.warn_at is None:
+            self.warn_at = self.calculate_warn_at()
+        super().save(*args, **kwargs)
+
+    def calculate_reaction_deadline(self):
+        """Посчитать крайний срок взятия в работу по времени реакции тарифа клиента"""
+        return self.created_at + timezone.timedelta(minutes=self.client.tariff.reaction_time_minutes)
+
+    def calculate_completion_deadline(self):
+        """Посчитать крайний срок выполнения по оценке подрядчика"""
+        estimated_hours = self.estimated_hours or self.DEFAULT_ESTIMATED_HOURS
+        return self.assigned_at + timezone.timedelta(hours=estimated_hours)
+
+    def calculate_warn_at(self):
+        """Посчитать момент предупреждения менеджеров по текущему статусу, None для закрытого заказа"""
+        if self.status not in self.WARNING_WINDOWS:
+            return None
+        limit_name, start_field, deadline_field = self.WARNING_WINDOWS[self.status]
+        start, deadline = getattr(self, start_field), getattr(self, deadline_field)
+        if start is None or deadline is None:
+            return None
+        return get_warn_at(start, deadline, system_settings.get(limit_name))
+
+    def take_in_work(self, contractor, estimated_hours) -> bool:
+        """Взять заказ в работу, False если его уже взял другой подрядчик"""
+        is_claimed = Order.objects.claim(self.pk, contractor, estimated_hours)
+        self.refresh_from_db(
+            fields=['contractor', 'estimated_hours', 'assigned_at', 'completion_deadline', 'warn_at', 'status']
+        )
+        if is_claimed:
+            on_commit(lambda: order_status_changed.send(sender=Order, order=self))
+        return is_claimed
+
+    def close_work(self) -> bool:
+        """Завершить заказ, False если он уже не в работе"""
+        return self.finish(self.Status.closed, [self.Status.in_work])
+
+    def cancel_work(self) -> bool:
+        """Отменить заказ, False если он уже закрыт или отменен"""
+        return self.finish(self.Status.cancelled, [self.Status.in_work, self.Status.created])
+
+    def finish(self, status, from_statuses) -> bool:
+        """
+        Закрыть заказ с итоговым статусом, если в БД он в одном из from_statuses.
+        Подрядчик заказа в работе становится свободным, False если заказ уже в другом статусе
+        """
+        closed_at = timezone.now()
         with atomic():
-            self.closed_at = timezone.now()
-            self.status = self.Status.cancelled
-            self.creds = ''
-            self.save()
+            # условные UPDATE не дадут закрыть заказ и освободить подрядчика дважды,
+            # если заказ параллельно закрывают или берут в работу по устаревшей копии
+            for from_status in from_statuses:
+                is_finished = Order.objects.filter(pk=self.pk, status=from_status).update(
+                    status=status,
+                    closed_at=closed_at,
+                    creds='',
+                    warn_at=None,
+                )
+                if is_finished:
+                    break
+            else:
+                return False
+            if from_status == self.Status.in_work:
+                # строка заблокирована нашим UPDATE, подрядчик берется из БД, а не из копии
+                contractor_id = Order.objects.filter(pk=self.pk).values_list('contractor_id', flat=True).get()
+                if contractor_id is not None:
+                    Contractor.objects.filter(pk=contractor_id).add_in_work_orders(-1)
+            self.refresh_from_db(fields=['status', 'closed_at', 'creds', 'warn_at', 'contractor'])
+            on_commit(lambda: order_status_changed.send(sender=Order, order=self))
+        return True
+
+    def get_warning_at(self):
+        """
+        Момент, когда заказ станет почти просроченным и пора предупредить менеджеров,
+        None если предупреждать не нужно
+        """
+        if self.status == self.Status.created and not self.not_in_work_manager_informed:
+            return self.warn_at
+        if self.status == self.Status.in_work and not self.late_work_manager_informed:
+            return self.warn_at
+        return None
 
     def encode_creds(self, creds):
         """Раскодировать доступы"""
@@ -480,11 +766,176 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(fields=['status', 'warn_at'], name='order_status_warn_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f'Заказ {self.pk} ({self.status})'
 
 
+class ClientBillingUsageQuerySet(models.QuerySet):
+    def get_or_create_for_period(self, client: Client, billing_start_date: timezone.datetime):
+        """
+        Получить счетчик биллинга, новый счетчик начинается с уже созданных в биллинге заказов.
+
+        Заказы считаются до вставки и вне транзакции: SQLite в режиме WAL не может повысить читающую
+        транзакцию до пишущей и сразу отвечает "database is locked". Параллельно созданный счетчик не мешает вставке
+        """
+        usage = self.filter(client=client, billing_start_date=billing_start_date).first()
+        if usage is not None:
+            return usage
+        orders_count = client.orders.filter(created_at__gte=billing_start_date).count()
+        self.bulk_create(
+            [ClientBillingUsage(client=client, billing_start_date=billing_start_date, orders_count=orders_count)],
+            ignore_conflicts=True,
+        )
+        return self.get(client=client, billing_start_date=billing_start_date)
+
+
+class ClientBillingUsage(models.Model):
+    client = models.ForeignKey(Client, related_name='billing_usages', on_delete=models.DO_NOTHING)
+    billing_start_date = models.DateTimeField('начало биллинга')
+    orders_count = models.PositiveIntegerField('число созданных заказов', default=0)
+
+    objects = ClientBillingUsageQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'использование тарифа за биллинг'
+        verbose_name_plural = 'использование тарифов за биллинги'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['client', 'billing_start_date'],
+                name='client_billing_usage_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.client} {self.billing_start_date:%Y-%m-%d}: {self.orders_count}'
+
+
+class OrderMonthlyStatQuerySet(models.QuerySet):
+    def get_rolled_up_until(self, billing_day: int, nearest_billing_start_date: timezone.datetime):
+        """
+        Получить начало первого закрытого биллинга, который еще нельзя досчитать.
+
+        Незавершенный заказ закрытого биллинга еще может быть отменен и поменять его статистику,
+        поэтому досчитываются только биллинги до первого незавершенного заказа
+        """
+        first_open_order_date = Order.objects.filter(
+            created_at__lt=nearest_billing_start_date,
+            status__in=[Order.Status.created, Order.Status.in_work],
+        ).aggregate(dt=Min('created_at'))['dt']
+        if first_open_order_date is None:
+            return nearest_billing_start_date
+        return min(nearest_billing_start_date, get_billing_start_date(first_open_order_date, billing_day))
+
+    def roll_up(self, billing_day: int, nearest_billing_start_date: timezone.datetime) -> timezone.datetime:
+        """
+        Досчитать статистику закрытых биллингов без незавершенных заказов, которых еще нет в таблице.
+
+        Посчитанные строки больше не пересчитываются, поэтому всегда считаются по всем заказам.
+        Возвращает начало первого биллинга, статистики которого нет в таблице
+        """
+        last_rolled_up_date = self.filter(
+            billing_day=billing_day,
+            client__isnull=True,
+        ).aggregate(dt=Max('billing_start_date'))['dt']
+        rolled_up_until = self.get_rolled_up_until(billing_day, nearest_billing_start_date)
+        orders = Order.objects.filter(created_at__lt=rolled_up_until)
+
+        if last_rolled_up_date is None:
+            first_order_date = orders.exclude(status=Order.Status.cancelled).aggregate(dt=Min('created_at'))['dt']
+            if first_order_date is None:
+                return rolled_up_until
+            billing_start_date = get_billing_start_date(first_order_date, billing_day)
+        else:
+            billing_start_date = timezone.localtime(last_rolled_up_date) + relativedelta.relativedelta(months=1)
+            orders = orders.filter(created_at__gte=billing_start_date)
+        if billing_start_date >= rolled_up_until:
+            return rolled_up_until
+
+        clients_stats_by_date = {}
+        for client_stat in orders.count_by_billing_period(billing_day):
+            client_billing_start_date = client_stat['billing_month'] + timezone.timedelta(days=billing_day - 1)
+            clients_stats = clients_stats_by_date.setdefault(client_billing_start_date, {})
+            clients_stats[client_stat['client']] = client_stat['count_orders']
+
+        monthly_stats = []
+        while billing_start_date < rolled_up_until:
+            clients_stats = clients_stats_by_date.get(billing_start_date, {})
+            for client_id, orders_count in clients_stats.items():
+                monthly_stats.append(
+                    OrderMonthlyStat(
+                        billing_day=billing_day,
+                        billing_start_date=billing_start_date,
+                        client_id=client_id,
+                        orders_count=orders_count,
+                    )
+                )
+            # строка без клиента это итог биллинга, она же отмечает что биллинг уже посчитан
+            monthly_stats.append(
+                OrderMonthlyStat(
+                    billing_day=billing_day,
+                    billing_start_date=billing_start_date,
+                    client=None,
+                    orders_count=sum(clients_stats.values()),
+                )
+            )
+            billing_start_date += relativedelta.relativedelta(months=1)
+        self.bulk_create(monthly_stats, ignore_conflicts=True)
+        return rolled_up_until
+
+    def get_rolled_up_stats(self, billing_day: int, rolled_up_until: timezone.datetime):
+        """Строки посчитанной статистики биллингов до rolled_up_until, читаются из БД частями"""
+        rolled_up_stats = self.filter(
+            billing_day=billing_day,
+            billing_start_date__lt=rolled_up_until,
+        ).order_by(
+            '-billing_start_date',
+            F('client__tg_nick').asc(nulls_last=True),
+        ).values_list('billing_start_date', 'client__tg_nick', 'orders_count')
+        for billing_start_date, client_nick, orders_count in rolled_up_stats.iterator(
+                chunk_size=settings.REPORT_ITERATOR_CHUNK_SIZE
+        ):
+            yield [billing_start_date, client_nick or 'Всего', orders_count]
+
+
+class OrderMonthlyStat(models.Model):
+    billing_day = models.PositiveSmallIntegerField('день биллинга')
+    billing_start_date = models.DateTimeField('начало биллинга')
+    client = models.ForeignKey(
+        Client,
+        related_name='monthly_order_stats',
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        help_text='пустой клиент означает итог по всем клиентам',
+    )
+    orders_count = models.PositiveIntegerField('число заказов')
+
+    objects = OrderMonthlyStatQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'статистика заказов за биллинг'
+        verbose_name_plural = 'статистика заказов за биллинги'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['billing_day', 'billing_start_date', 'client'],
+                name='order_monthly_stat_unique_client',
+            ),
+            models.UniqueConstraint(
+                fields=['billing_day', 'billing_start_date'],
+                condition=Q(client__isnull=True),
+                name='order_monthly_stat_unique_total',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.billing_start_date:%Y-%m-%d} {self.client or "Всего"}: {self.orders_count}'
+
+
 class SystemSettings(models.Model):
     parameter_name = models.CharField(
         'имя системного параметра',
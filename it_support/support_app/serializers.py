@@ -0,0 +1,35 @@
+from rest_framework import serializers
+
+from support_app.models import Order
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    client_tg_nick = serializers.CharField(source='client.tg_nick', read_only=True)
+    contractor_tg_nick = serializers.CharField(source='contractor.tg_nick', read_only=True, default=None)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id',
+            'task',
+            'status',
+            'client',
+            'client_tg_nick',
+            'contractor',
+            'contractor_tg_nick',
+            'created_at',
+            'assigned_at',
+            'closed_at',
+            'estimated_hours',
+            'reaction_deadline',
+            'completion_deadline',
+        ]
+
+
+class OrdersFilterSerializer(serializers.Serializer):
+    """Фильтры списка заказов из параметров запроса"""
+    status = serializers.ChoiceField(choices=Order.Status.choices, required=False)
+    client = serializers.IntegerField(required=False)
+    contractor = serializers.IntegerField(required=False)
+    created_from = serializers.DateTimeField(required=False)
+    created_to = serializers.DateTimeField(required=False)
@@ -0,0 +1,36 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import Signal
+from django.dispatch import receiver
+
+from support_app.sqlite_profile import apply_sqlite_pragmas
+from support_app.system_settings import system_settings
+
+# отправляется после коммита транзакции создания заказа, аргумент order
+order_created = Signal()
+# отправляется после коммита взятия заказа в работу, закрытия или отмены, аргумент order
+order_status_changed = Signal()
+
+
+@receiver(post_save, sender='support_app.SystemSettings')
+@receiver(post_delete, sender='support_app.SystemSettings')
+def invalidate_system_settings(sender, **kwargs) -> None:
+    """Сбросить кэш системных параметров при изменении в админке"""
+    system_settings.invalidate()
+
+
+@receiver(post_save, sender='support_app.SystemSettings')
+@receiver(post_delete, sender='support_app.SystemSettings')
+def recalculate_orders_warn_at(sender, instance, **kwargs) -> None:
+    """Пересчитать моменты предупреждения открытых заказов при изменении порогов, кэш уже сброшен"""
+    from support_app.models import Order
+
+    if instance.parameter_name in {limit_name for limit_name, *_ in Order.WARNING_WINDOWS.values()}:
+        Order.objects.recalculate_warn_at()
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs) -> None:
+    """Применить настройки SQLite к новому соединению"""
+    apply_sqlite_pragmas(connection)
@@ -0,0 +1,33 @@
+from typing import Any
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+
+def get_pragma_value(value: Any) -> str:
+    """Значение PRAGMA - число или слово, другие значения в SQL не подставляются"""
+    if isinstance(value, int) or (isinstance(value, str) and value.isalnum()):
+        return str(value)
+    raise ValueError(f'Wrong SQLite pragma value: {value!r}')
+
+
+def apply_sqlite_pragmas(connection: BaseDatabaseWrapper) -> None:
+    """Применить SQLITE_PRAGMAS к новому соединению с SQLite, остальные БД не трогаются"""
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {get_pragma_value(value)}')
+
+
+def optimize_sqlite(*args: Any) -> None:
+    """
+    Обновить статистику планировщика и перенести WAL в файл БД, чтобы WAL не рос.
+
+    args для вызова из задачи бота
+    """
+    if default_connection.vendor != 'sqlite':
+        return
+    with default_connection.cursor() as cursor:
+        cursor.execute('PRAGMA optimize')
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
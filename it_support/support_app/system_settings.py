@@ -0,0 +1,112 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+
+
+def parse_int(value: str) -> int:
+    """Целое число"""
+    return int(value)
+
+
+def parse_billing_day(value: str) -> int:
+    """День биллинга, от 1 до 28 включительно"""
+    billing_day = int(value)
+    if not 1 <= billing_day <= 28:
+        raise ValueError(f'Billing day should be from 1 to 28, got {billing_day}')
+    return billing_day
+
+
+def parse_percent(value: str) -> float:
+    """Процент от 1 до 100, возвращается доля от единицы"""
+    percent = int(value)
+    if not 1 <= percent <= 100:
+        raise ValueError(f'Percent should be from 1 to 100, got {percent}')
+    return percent / 100
+
+
+class SystemParameter(object):
+    """Описание системного параметра: имя, парсер значения и значение по умолчанию"""
+
+    def __init__(self, name: str, parser: Callable[[str], Any], default: Any) -> None:
+        self.name = name
+        self.parser = parser
+        self.default = default
+
+    def parse(self, raw_value: Optional[str]) -> Any:
+        """Преобразовать значение из БД в типизированное, при ошибке вернуть значение по умолчанию"""
+        if raw_value is None or not raw_value.strip():
+            return self.default
+        try:
+            return self.parser(raw_value.strip())
+        except (TypeError, ValueError):
+            return self.default
+
+
+SYSTEM_PARAMETERS = {
+    parameter.name: parameter
+    for parameter in [
+        SystemParameter('ASSIGNED_CONTRACTORS_TIME_LIMIT', parse_percent, 0.2),
+        SystemParameter('INFORM_MANAGER_IN_WORK_PROJECT_LIMIT', parse_percent, 0.95),
+        SystemParameter('INFORM_MANAGER_CREATED_PROJECT_LIMIT', parse_percent, 0.95),
+        SystemParameter('BILLING_DAY', parse_billing_day, 1),
+        SystemParameter('ORDER_RATE', parse_int, 500),
+    ]
+}
+
+
+class SystemSettingsRegistry(object):
+    """
+    Кэш системных параметров в памяти процесса.
+
+    Все параметры загружаются из БД одним запросом при первом обращении,
+    сбрасываются сигналами при изменении SystemSettings в этом процессе
+    и перечитываются не реже чем раз в SYSTEM_SETTINGS_CACHE_TTL секунд,
+    чтобы изменения из админки доходили и до процесса бота.
+    """
+
+    def __init__(self, parameters: dict[str, SystemParameter]) -> None:
+        self.parameters = parameters
+        self._values = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """Получить типизированное значение параметра"""
+        values = self._values
+        if values is None or self._is_expired():
+            values = self._load()
+        return values[name]
+
+    def invalidate(self) -> None:
+        """Сбросить кэш, значения перечитаются при следующем обращении"""
+        self._values = None
+
+    def _is_expired(self) -> bool:
+        ttl = getattr(settings, 'SYSTEM_SETTINGS_CACHE_TTL', None)
+        if not ttl:
+            return False
+        return time.monotonic() - self._loaded_at > ttl
+
+    def _load(self) -> dict[str, Any]:
+        from support_app.models import SystemSettings
+
+        with self._lock:
+            if self._values is not None and not self._is_expired():
+                return self._values
+            raw_values = dict(
+                SystemSettings.objects.filter(
+                    parameter_name__in=list(self.parameters.keys())
+                ).values_list('parameter_name', 'parameter_value')
+            )
+            values = {
+                name: parameter.parse(raw_values.get(name))
+                for name, parameter in self.parameters.items()
+            }
+            self._values = values
+            self._loaded_at = time.monotonic()
+            return values
+
+
+system_settings = SystemSettingsRegistry(SYSTEM_PARAMETERS)
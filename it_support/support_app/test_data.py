@@ -0,0 +1,263 @@
+import itertools
+import random
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Iterator, NamedTuple
+
+import django
+from django.db import connections
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from support_app.models import AssignedContractor
+from support_app.models import BotUser
+from support_app.models import Client
+from support_app.models import Contractor
+from support_app.models import Order
+from support_app.models import Tariff
+
+TEST_PREFIX = 'test'
+
+# лимит заказов, время реакции в минутах, можно закрепить подрядчика, видны контакты подрядчика, цена
+TARIFF_TEMPLATES = [
+    (5, 1440, False, False, Decimal(4000)),
+    (15, 1440, False, False, Decimal(10000)),
+    (50, 60, True, True, Decimal(25000)),
+]
+
+INACTIVE_USERS_SHARE = 0.1
+NOT_PAID_CLIENTS_SHARE = 0.1
+ASSIGNED_CONTRACTOR_SHARE = 0.5
+CANCELLED_ORDERS_SHARE = 0.05
+IN_WORK_OPEN_ORDERS_SHARE = 0.5
+
+
+class OrdersChunk(NamedTuple):
+    """Параметры генерации одной пачки исторических заказов, пачка генерируется одинаково при одном seed"""
+    seed: int
+    number: int
+    size: int
+    first_task_number: int
+    start: timezone.datetime
+    end: timezone.datetime
+    reaction_minutes_by_client: dict[int, int]
+    contractor_ids: list[int]
+
+
+def get_chunk_random(seed: int, chunk_number: int) -> random.Random:
+    return random.Random(f'{seed}:{chunk_number}')
+
+
+def create_tariffs(count: int) -> list[Tariff]:
+    """Создать тестовые тарифы по кругу из шаблонов"""
+    tariffs = []
+    for i in range(count):
+        orders_limit, reaction_time_minutes, can_reserve_contractor, can_see_contractor_contacts, price = \
+            TARIFF_TEMPLATES[i % len(TARIFF_TEMPLATES)]
+        tariffs.append(
+            Tariff(
+                name=f'{TEST_PREFIX}{i + 1}',
+                orders_limit=orders_limit,
+                reaction_time_minutes=reaction_time_minutes,
+                can_reserve_contractor=can_reserve_contractor,
+                can_see_contractor_contacts=can_see_contractor_contacts,
+                price=price,
+            )
+        )
+    for tariff in tariffs:
+        # bulk_create не везде возвращает pk, тарифов мало
+        tariff.save()
+    return tariffs
+
+
+def create_users(
+        seed: int,
+        clients_count: int,
+        contractors_count: int,
+        tariffs: list[Tariff],
+) -> tuple[list[Client], list[Contractor]]:
+    """
+    Создать тестовых клиентов и подрядчиков.
+
+    Часть пользователей неактивна, часть клиентов не оплатила тариф,
+    части клиентов с подходящим тарифом закреплен подрядчик
+    """
+    rng = get_chunk_random(seed, -1)
+    clients = []
+    contractors = []
+    # bulk_create не работает с наследованными моделями, поэтому по одному, но в одной транзакции
+    with atomic():
+        for i in range(clients_count):
+            client = Client(
+                tg_nick=f'{TEST_PREFIX}client{i}',
+                role=BotUser.Role.client,
+                status=BotUser.Status.inactive if rng.random() < INACTIVE_USERS_SHARE else BotUser.Status.active,
+                tariff=rng.choice(tariffs),
+                paid=rng.random() >= NOT_PAID_CLIENTS_SHARE,
+            )
+            client.save()
+            clients.append(client)
+        for i in range(contractors_count):
+            contractor = Contractor(
+                tg_nick=f'{TEST_PREFIX}contractor{i}',
+                role=BotUser.Role.contractor,
+                status=BotUser.Status.inactive if rng.random() < INACTIVE_USERS_SHARE else BotUser.Status.active,
+            )
+            contractor.save()
+            contractors.append(contractor)
+
+        if contractors:
+            AssignedContractor.objects.bulk_create(
+                AssignedContractor(client=client, contractor=rng.choice(contractors))
+                for client in clients
+                if client.tariff.can_reserve_contractor and rng.random() < ASSIGNED_CONTRACTOR_SHARE
+            )
+    return clients, contractors
+
+
+def generate_history_orders(chunk: OrdersChunk) -> Iterator[Order]:
+    """Сгенерировать закрытые и отмененные заказы пачки, клиенты с большим номером заказывают реже"""
+    rng = get_chunk_random(chunk.seed, chunk.number)
+    client_ids = list(chunk.reaction_minutes_by_client)
+    client_cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(client_ids))))
+    orders_client_ids = rng.choices(client_ids, cum_weights=client_cum_weights, k=chunk.size)
+    period_seconds = (chunk.end - chunk.start).total_seconds()
+    for i, client_id in enumerate(orders_client_ids):
+        task_number = chunk.first_task_number + i
+        reaction_minutes = chunk.reaction_minutes_by_client[client_id]
+        created_at = chunk.start + timezone.timedelta(seconds=rng.random() * period_seconds)
+        order = Order(
+            task=f'{TEST_PREFIX}task{task_number}',
+            client_id=client_id,
+            created_at=created_at,
+            reaction_deadline=created_at + timezone.timedelta(minutes=reaction_minutes),
+            not_in_work_manager_informed=True,
+            late_work_manager_informed=True,
+            assigned_contractors_informed=True,
+            all_contractors_informed=True,
+        )
+        if rng.random() < CANCELLED_ORDERS_SHARE or not chunk.contractor_ids:
+            order.status = Order.Status.cancelled
+            order.closed_at = created_at + timezone.timedelta(minutes=rng.randint(1, reaction_minutes))
+        else:
+            # иногда заказ берут и выполняют позже срока
+            order.status = Order.Status.closed
+            order.contractor_id = rng.choice(chunk.contractor_ids)
+            order.estimated_hours = rng.randint(1, 24)
+            order.assigned_at = created_at + timezone.timedelta(minutes=rng.randint(1, int(reaction_minutes * 1.2)))
+            order.completion_deadline = order.assigned_at + timezone.timedelta(hours=order.estimated_hours)
+            order.closed_at = order.assigned_at + timezone.timedelta(
+                minutes=rng.randint(1, int(order.estimated_hours * 60 * 1.2))
+            )
+        yield order
+
+
+def create_history_orders_chunk(chunk: OrdersChunk) -> int:
+    """Сгенерировать и записать пачку заказов, вызывается в том числе в дочерних процессах"""
+    orders = list(generate_history_orders(chunk))
+    Order.objects.bulk_create(orders, batch_size=chunk.size)
+    return len(orders)
+
+
+def init_worker() -> None:
+    """Подготовить дочерний процесс, соединения с БД нельзя делить между процессами"""
+    django.setup()
+    connections.close_all()
+
+
+def create_history_orders(
+        seed: int,
+        orders_count: int,
+        days: int,
+        clients: list[Client],
+        contractors: list[Contractor],
+        batch_size: int,
+        workers: int,
+        now: timezone.datetime,
+) -> int:
+    """
+    Создать закрытые и отмененные заказы за последние days дней пачками по batch_size.
+
+    Пачки не зависят друг от друга, поэтому могут создаваться в пуле из workers процессов,
+    результат не зависит от числа процессов
+    """
+    if not clients or orders_count <= 0:
+        return 0
+    reaction_minutes_by_client = {client.pk: client.tariff.reaction_time_minutes for client in clients}
+    contractor_ids = [contractor.pk for contractor in contractors]
+    # последние трое суток оставлены под открытые заказы, так закрытые заказы не закрываются в будущем
+    end = now - timezone.timedelta(days=3)
+    start = end - timezone.timedelta(days=days)
+    chunks = [
+        OrdersChunk(
+            seed=seed,
+            number=chunk_number,
+            size=min(batch_size, orders_count - first_task_number),
+            first_task_number=first_task_number,
+            start=start,
+            end=end,
+            reaction_minutes_by_client=reaction_minutes_by_client,
+            contractor_ids=contractor_ids,
+        )
+        for chunk_number, first_task_number in enumerate(range(0, orders_count, batch_size))
+    ]
+
+    if workers <= 1:
+        return sum(create_history_orders_chunk(chunk) for chunk in chunks)
+
+    # дочерние процессы не должны унаследовать открытое соединение
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        return sum(executor.map(create_history_orders_chunk, chunks))
+
+
+def create_open_orders(
+        seed: int,
+        orders_count: int,
+        first_task_number: int,
+        clients: list[Client],
+        contractors: list[Contractor],
+        now: timezone.datetime,
+) -> int:
+    """
+    Создать открытые заказы: новые и в работе, часть из них уже почти или полностью просрочена.
+
+    У клиента не больше одного открытого заказа, у подрядчика не больше одного заказа в работе
+    """
+    rng = get_chunk_random(seed, -2)
+    active_clients = [
+        client for client in clients
+        if client.status == BotUser.Status.active and client.paid
+    ]
+    free_contractors = [
+        contractor for contractor in contractors
+        if contractor.status == BotUser.Status.active
+    ]
+    rng.shuffle(free_contractors)
+    orders = []
+    for i, client in enumerate(rng.sample(active_clients, min(orders_count, len(active_clients)))):
+        reaction_minutes = client.tariff.reaction_time_minutes
+        created_at = now - timezone.timedelta(minutes=rng.randint(0, int(reaction_minutes * 1.5)))
+        order = Order(
+            task=f'{TEST_PREFIX}task{first_task_number + i}',
+            client=client,
+            created_at=created_at,
+            reaction_deadline=created_at + timezone.timedelta(minutes=reaction_minutes),
+            creds=f'{TEST_PREFIX}creds{first_task_number + i}',
+            assigned_contractors_informed=rng.random() < 0.5,
+        )
+        order.all_contractors_informed = order.assigned_contractors_informed and rng.random() < 0.5
+        if free_contractors and rng.random() < IN_WORK_OPEN_ORDERS_SHARE:
+            order.status = Order.Status.in_work
+            order.contractor = free_contractors.pop()
+            order.estimated_hours = rng.randint(1, 24)
+            order.assigned_at = created_at + (now - created_at) * rng.random()
+            order.completion_deadline = order.assigned_at + timezone.timedelta(hours=order.estimated_hours)
+            order.assigned_contractors_informed = True
+            order.all_contractors_informed = True
+        order.warn_at = order.calculate_warn_at()
+        orders.append(order)
+    Order.objects.bulk_create(orders)
+    # bulk_create не занимает подрядчиков, как это делает взятие заказа в работу
+    Contractor.objects.filter(pk__in=[contractor.pk for contractor in contractors]).recount_in_work_orders()
+    return len(orders)
@@ -1,3 +1,126 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TransactionTestCase
+from dateutil import relativedelta
+from django.utils import timezone
 
-# Create your tests here.
+from support_app.models import BotUser
+from support_app.models import Client
+from support_app.models import ClientBillingUsage
+from support_app.models import Contractor
+from support_app.models import Order
+from support_app.models import OrderMonthlyStat
+from support_app.models import Tariff
+from support_app.models import get_nearest_billing_start_date
+from support_app.signals import order_status_changed
+from support_app.system_settings import system_settings
+
+
+def create_test_client() -> Client:
+    tariff = Tariff.objects.create(
+        name='test',
+        orders_limit=10,
+        reaction_time_minutes=60,
+        can_reserve_contractor=False,
+        can_see_contractor_contacts=False,
+        price=1000,
+    )
+    return Client.objects.create(
+        tg_nick='test_client',
+        role=BotUser.Role.client,
+        status=BotUser.Status.active,
+        tariff=tariff,
+        paid=True,
+    )
+
+
+class ClientBillingUsageTests(TransactionTestCase):
+    def setUp(self):
+        self.client_user = create_test_client()
+        self.billing_start_date = get_nearest_billing_start_date()
+
+    def test_new_usage_counts_orders_without_read_in_write_transaction(self):
+        """SQLite в режиме WAL сразу отвечает "database is locked" транзакции, которая читала до записи"""
+        Order.objects.create(client=self.client_user, task='task1', creds='')
+        Order.objects.create(client=self.client_user, task='task2', creds='')
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            queries.append((connection.in_atomic_block, sql))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record_query):
+            usage = ClientBillingUsage.objects.get_or_create_for_period(self.client_user, self.billing_start_date)
+
+        self.assertEqual(usage.orders_count, 2)
+        self.assertFalse([sql for in_atomic_block, sql in queries if in_atomic_block and sql.startswith('SELECT')])
+
+    def test_existing_usage_is_returned(self):
+        usage = ClientBillingUsage.objects.get_or_create_for_period(self.client_user, self.billing_start_date)
+        ClientBillingUsage.objects.filter(pk=usage.pk).update(orders_count=5)
+
+        same_usage = ClientBillingUsage.objects.get_or_create_for_period(self.client_user, self.billing_start_date)
+
+        self.assertEqual(same_usage.pk, usage.pk)
+        self.assertEqual(same_usage.orders_count, 5)
+
+    def test_order_is_created_within_limit(self):
+        order = Order.objects.create_within_limit(self.client_user, task='task', creds='')
+
+        self.assertIsNotNone(order)
+        self.assertEqual(ClientBillingUsage.objects.get(client=self.client_user).orders_count, 1)
+
+
+class ContractorDeleteFromBotTests(TransactionTestCase):
+    def test_released_order_is_warned_by_reaction_deadline(self):
+        contractor = Contractor.objects.create(
+            tg_nick='test_contractor',
+            role=BotUser.Role.contractor,
+            status=BotUser.Status.active,
+        )
+        order = Order.objects.create(client=create_test_client(), task='task', creds='')
+        order.take_in_work(contractor, 24)
+        now = timezone.now()
+        Order.objects.filter(pk=order.pk).update(
+            created_at=now - timezone.timedelta(hours=2),
+            reaction_deadline=now - timezone.timedelta(hours=1),
+        )
+        changed_orders = []
+
+        def on_order_status_changed(sender, order, **kwargs):
+            changed_orders.append(order)
+
+        order_status_changed.connect(on_order_status_changed)
+        try:
+            contractor.delete_from_bot()
+        finally:
+            order_status_changed.disconnect(on_order_status_changed)
+
+        self.assertEqual(list(Order.objects.get_warning_orders_not_in_work()), [order])
+        self.assertEqual([changed_order.pk for changed_order in changed_orders], [order.pk])
+
+
+class OrderMonthlyStatTests(TransactionTestCase):
+    def test_billing_with_open_order_is_not_rolled_up(self):
+        """Отмена незавершенного заказа закрытого биллинга меняет его статистику"""
+        client = create_test_client()
+        billing_day = system_settings.get('BILLING_DAY')
+        nearest_billing_start_date = get_nearest_billing_start_date()
+        prev_billing_start_date = nearest_billing_start_date - relativedelta.relativedelta(months=1)
+        closed_order = Order.objects.create(client=client, task='closed', creds='')
+        open_order = Order.objects.create(client=client, task='open', creds='')
+        Order.objects.filter(pk__in=[closed_order.pk, open_order.pk]).update(
+            created_at=prev_billing_start_date + timezone.timedelta(hours=1),
+        )
+        Order.objects.filter(pk=closed_order.pk).update(status=Order.Status.closed)
+
+        stats = list(Order.objects.get_closed_billings_stats(billing_day, nearest_billing_start_date))
+        self.assertEqual(stats[-1], [prev_billing_start_date, 'Всего', 2])
+        self.assertFalse(OrderMonthlyStat.objects.exists())
+
+        open_order.cancel_work()
+        stats = list(Order.objects.get_closed_billings_stats(billing_day, nearest_billing_start_date))
+        self.assertEqual(stats[-1], [prev_billing_start_date, 'Всего', 1])
+        self.assertEqual(
+            list(OrderMonthlyStat.objects.get_rolled_up_stats(billing_day, nearest_billing_start_date)),
+            [[prev_billing_start_date, client.tg_nick, 1], [prev_billing_start_date, 'Всего', 1]],
+        )
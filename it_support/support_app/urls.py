@@ -0,0 +1,12 @@
+from django.urls import path
+
+from support_app import views
+
+app_name = 'support_app'
+
+urlpatterns = [
+    path('orders/', views.OrderList.as_view(), name='orders'),
+    path('reports/billing/', views.BillingReport.as_view(), name='billing_report'),
+    path('reports/monthly-stats/', views.MonthlyStatsReport.as_view(), name='monthly_stats_report'),
+    path('reports/queues/', views.QueuesReport.as_view(), name='queues_report'),
+]
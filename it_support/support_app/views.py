@@ -1,3 +1,173 @@
-from django.shortcuts import render
+import hashlib
+import json
+from typing import Any, Callable, Optional
 
-# Create your views here.
+from dateutil import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
+from rest_framework import generics
+from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from support_app.models import Contractor
+from support_app.models import Order
+from support_app.models import OrderMonthlyStat
+from support_app.models import get_nearest_billing_start_date
+from support_app.serializers import OrderSerializer
+from support_app.serializers import OrdersFilterSerializer
+from support_app.system_settings import system_settings
+
+CACHE_KEY_PREFIX = 'support_app_api'
+
+
+def get_cached_report(key: str, timeout: Optional[int], get_data: Callable[[], Any]) -> tuple[str, Any]:
+    """
+    Получить данные отчета и их ETag из кеша, посчитать и закешировать если их там нет.
+
+    timeout None кеширует навсегда, ключ должен меняться вместе с данными
+    """
+    key = f'{CACHE_KEY_PREFIX}:{key}'
+    cached = cache.get(key)
+    if cached is None:
+        data = json.loads(json.dumps(get_data(), cls=DjangoJSONEncoder))
+        etag = hashlib.md5(json.dumps(data, sort_keys=True).encode('utf8')).hexdigest()
+        cached = (etag, data)
+        cache.set(key, cached, timeout)
+    return cached
+
+
+def get_report_response(request: Request, etag: str, data: Any) -> Response:
+    """Ответ с ETag, если у клиента уже есть эти данные - пустой ответ 304"""
+    etag = quote_etag(etag)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(data, headers={'ETag': etag})
+
+
+class OrdersPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class OrderList(generics.ListAPIView):
+    """Заказы с фильтрами по статусу, клиенту, подрядчику и дате создания"""
+    permission_classes = [IsAdminUser]
+    serializer_class = OrderSerializer
+    pagination_class = OrdersPagination
+
+    def get_queryset(self):
+        filters = OrdersFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        filters = filters.validated_data
+
+        orders = Order.objects.select_related('client', 'contractor')
+        if 'status' in filters:
+            orders = orders.filter(status=filters['status'])
+        if 'client' in filters:
+            orders = orders.filter(client=filters['client'])
+        if 'contractor' in filters:
+            orders = orders.filter(contractor=filters['contractor'])
+        if 'created_from' in filters:
+            orders = orders.filter(created_at__gte=filters['created_from'])
+        if 'created_to' in filters:
+            orders = orders.filter(created_at__lt=filters['created_to'])
+        return orders
+
+
+class BillingReport(APIView):
+    """Биллинг подрядчиков за прошедший финансовый месяц, он уже закрыт и кешируется навсегда"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request: Request) -> Response:
+        billing_start_date = get_nearest_billing_start_date() - relativedelta.relativedelta(months=1)
+
+        def get_data():
+            return {
+                'billing_start_date': billing_start_date,
+                'contractors': [
+                    {
+                        'contractor': contractor_stat['contractor__tg_nick'],
+                        'orders_count': contractor_stat['count_orders'],
+                    }
+                    for contractor_stat in Order.objects.calculate_billing().order_by('contractor__tg_nick')
+                ],
+            }
+
+        etag, data = get_cached_report(f'billing:{billing_start_date.isoformat()}', None, get_data)
+        return get_report_response(request, etag, data)
+
+
+class MonthlyStatsReport(APIView):
+    """
+    Число заказов клиентов по финансовым месяцам.
+
+    Посчитанные закрытые месяцы не меняются и кешируются навсегда. Текущий месяц и закрытые месяцы
+    с незавершенными заказами кешируются на API_CURRENT_PERIOD_CACHE_TTL
+    """
+    permission_classes = [IsAdminUser]
+
+    @staticmethod
+    def get_rows_data(rows) -> list[dict[str, Any]]:
+        return [
+            {'billing_start_date': billing_start_date, 'client': client_nick, 'orders_count': orders_count}
+            for billing_start_date, client_nick, orders_count in rows
+        ]
+
+    def get(self, request: Request) -> Response:
+        billing_day = system_settings.get('BILLING_DAY')
+        nearest_billing_start_date = get_nearest_billing_start_date()
+        rolled_up_until = OrderMonthlyStat.objects.roll_up(billing_day, nearest_billing_start_date)
+        key = f'monthly_stats:{billing_day}:{nearest_billing_start_date.isoformat()}'
+
+        current_etag, current_data = get_cached_report(
+            f'{key}:current:{rolled_up_until.isoformat()}',
+            settings.API_CURRENT_PERIOD_CACHE_TTL,
+            lambda: self.get_rows_data(
+                Order.objects.get_billings_stats(
+                    billing_day,
+                    rolled_up_until,
+                    nearest_billing_start_date + relativedelta.relativedelta(months=1),
+                )
+            ),
+        )
+        closed_etag, closed_data = get_cached_report(
+            f'{key}:closed:{rolled_up_until.isoformat()}',
+            None,
+            lambda: self.get_rows_data(OrderMonthlyStat.objects.get_rolled_up_stats(billing_day, rolled_up_until)),
+        )
+        return get_report_response(request, f'{current_etag}-{closed_etag}', current_data + closed_data)
+
+
+class QueuesReport(APIView):
+    """Текущие счетчики очередей заказов и подрядчиков, кешируются на API_QUEUES_CACHE_TTL"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request: Request) -> Response:
+        def get_data():
+            orders_counts = Order.objects.aggregate(
+                created=Count('id', filter=Q(status=Order.Status.created)),
+                created_not_informed=Count(
+                    'id',
+                    filter=Q(status=Order.Status.created, all_contractors_informed=False),
+                ),
+                in_work=Count('id', filter=Q(status=Order.Status.in_work)),
+            )
+            return {
+                'orders': orders_counts,
+                'warning_orders_not_in_work': Order.objects.get_warning_orders_not_in_work().count(),
+                'warning_orders_not_closed': Order.objects.get_warning_orders_not_closed().count(),
+                'available_contractors': Contractor.objects.get_available().count(),
+            }
+
+        etag, data = get_cached_report('queues', settings.API_QUEUES_CACHE_TTL, get_data)
+        return get_report_response(request, etag, data)
@@ -1,3 +1,8 @@
 from django.contrib import admin
 
-# Register your models here.
+from tgbot_app import models as m
+
+
+@admin.register(m.BotLease)
+class BotLeaseAdmin(admin.ModelAdmin):
+    list_display = ['name', 'holder', 'expires_at']
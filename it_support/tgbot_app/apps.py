@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TgbotAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tgbot_app'
+
+    def ready(self):
+        from tgbot_app import signals  # noqa: F401
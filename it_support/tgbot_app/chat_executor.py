@@ -0,0 +1,62 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class ChatSerialExecutor(object):
+    """
+    Thread pool which runs tasks of different chats in parallel and tasks of one chat strictly in order.
+
+    Every chat has its own queue, only one worker takes tasks from it at a time.
+    After every task the chat goes back to the pool, so one busy chat doesn't hold a worker forever.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat_executor')
+        self.chat_queues: dict[Hashable, deque] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, chat_id: Hashable, func: Callable, *args: Any) -> None:
+        """Put task to chat queue, it will be run after all previous tasks of this chat"""
+        with self.lock:
+            chat_queue = self.chat_queues.get(chat_id)
+            if chat_queue is not None:
+                # chat is already scheduled, its worker will take this task
+                chat_queue.append((func, args))
+                return
+            self.chat_queues[chat_id] = deque([(func, args)])
+        self.executor.submit(self.run_next, chat_id)
+
+    def run_next(self, chat_id: Hashable) -> None:
+        while True:
+            with self.lock:
+                func, args = self.chat_queues[chat_id][0]
+            try:
+                func(*args)
+            except Exception:
+                logger.exception('Task of chat %s failed', chat_id)
+            finally:
+                close_old_connections()
+
+            with self.lock:
+                chat_queue = self.chat_queues[chat_id]
+                chat_queue.popleft()
+                if not chat_queue:
+                    del self.chat_queues[chat_id]
+                    return
+            try:
+                self.executor.submit(self.run_next, chat_id)
+                return
+            except RuntimeError:
+                # executor is stopping, rest tasks of chat are finished by this worker
+                continue
+
+    def stop(self) -> None:
+        """Wait for running tasks and stop workers"""
+        self.executor.shutdown(wait=True)
@@ -1,55 +1,30 @@
-from textwrap import dedent
-
-from telegram import InlineKeyboardButton
 from telegram import InlineKeyboardMarkup
 from telegram.ext.callbackcontext import CallbackContext
 from telegram.update import Update
 
 from support_app.models import Order
 from support_app.models import Client
+from tgbot_app.content import content
 
 
 def start_client(update: Update, context: CallbackContext) -> str:
     """Client start function which send a menu"""
     chat_id = update.effective_chat.id
-    text = 'Здравствуйте, что вы хотите?'
-    client = context.user_data['user'].client
-
-    keyboard = [
-        [InlineKeyboardButton('Хочу оставить заявку', callback_data='create_order')],
-        [InlineKeyboardButton('Связаться с подрядчиком', callback_data='send_message_to_contractor')],
-    ]
-    if client.tariff.can_see_contractor_contacts:
-        keyboard.append(
-            [
-                InlineKeyboardButton(
-                    'Хочу получить список подрядчиков, которые мне помогали',
-                    callback_data='see_my_contractors'
-                )
-            ]
-        )
-    if client.tariff.can_reserve_contractor:
-        keyboard.append(
-            [
-                InlineKeyboardButton(
-                    'Закрепить последнего подрядчика', callback_data='bind_contractors'
-                )
-            ]
-        )
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+    client = context.user_data['user']
+    reply_markup = content.get_client_menu_keyboard(
+        client.tariff.can_see_contractor_contacts,
+        client.tariff.can_reserve_contractor,
+    )
+    context.bot.send_message(chat_id=chat_id, text=content.CLIENT_MENU_TEXT, reply_markup=reply_markup)
     return 'HANDLE_MENU_CLIENT'
 
 
 def handle_menu_client(update: Update, context: CallbackContext) -> str:
     chat_id = update.effective_chat.id
     query = update.callback_query
-    client = context.user_data['user'].client
+    client = context.user_data['user']
     client_create_callbacks = ['create_order', 'get_back', 'get_back_to_order_creation']
-    keyboard = [
-        [InlineKeyboardButton('Вернуться назад', callback_data='get_back')],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = content.get_back_keyboard
     message = 'Я вас не понял, нажмите одну из предложенных кнопок'  # answer when no one of if is True
     if query and query.data in client_create_callbacks:  # client request order creation
         is_return, what_return, message = handle_client_creation_callbacks(context, client, chat_id, reply_markup)
@@ -96,19 +71,8 @@ def handle_client_creation_callbacks(
         message = 'Ваша заявка ещё в обработке, пожалуйста ожидайте'
         return False, '', message
     else:
-        with open('order_examples.txt', 'r', encoding='UTF8') as file:  # TODO: сохранить при старте бота
-            message = dedent('''
-            Вы можете оставить заявку в чате в формате:
-            - Сроки исполнения
-            - Суть заказа
-            - Что-нибудь еще
-
-            Примеры заявок:
-            ''')
-            order_examples = file.readlines()
-            for order_example in order_examples:
-                message += order_example
-            context.bot.send_message(chat_id=chat_id, text=message, reply_markup=reply_markup)
+        message = content.get_create_order_message()
+        context.bot.send_message(chat_id=chat_id, text=message, reply_markup=reply_markup)
         return True, 'WAITING_ORDER_TASK', ''
 
 
@@ -145,7 +109,7 @@ def wait_message_to_contractor_client(update: Update, context: CallbackContext)
     if update.message:
         message_to_contractor = update.message.text
         no_text_message = False
-    client = context.user_data['user'].client
+    client = context.user_data['user']
     if query and query.data == 'get_back':
         return start_client(update, context)
     elif not client.has_in_work_order() or no_text_message:  # if order disappeared or client send not a text
@@ -182,10 +146,7 @@ def waiting_order_task(update: Update, context: CallbackContext) -> str:
     else:
         context.user_data['creating_order_task'] = order_task
         message = 'Пришлите логин и пароль одним сообщением.\nПример:\nЛогин: Иван\nПароль: qwerty'
-        keyboard = [
-            [InlineKeyboardButton('Вернуться назад', callback_data='get_back_to_order_creation')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = content.get_back_to_order_creation_keyboard
         context.bot.send_message(chat_id=chat_id, text=message, reply_markup=reply_markup)
         return 'WAITING_CREDENTIALS'
 
@@ -198,7 +159,7 @@ def waiting_credentials(update: Update, context: CallbackContext) -> str:
     if update.message:
         credentials = update.message.text
         no_text_message = False
-    client = context.user_data['user'].client
+    client = context.user_data['user']
 
     if query and query.data == 'get_back_to_order_creation':
         return handle_menu_client(update, context)
@@ -216,9 +177,12 @@ def waiting_credentials(update: Update, context: CallbackContext) -> str:
         hours = client.tariff.orders_limit // 60
         minutes = client.tariff.orders_limit % 60
         # TODO: шифрование кредсов
-        order = Order(task=order_task, client=client, creds=credentials)
-        order.save()
+        order = Order.objects.create_within_limit(client, task=order_task, creds=credentials)
         context.user_data['creating_order_task'] = None
+        if order is None:  # limit was spent by another order while this one was being created
+            message = 'На вашем тарифе закончились заявки, вы можете купить повышенный тариф'
+            context.bot.send_message(chat_id=chat_id, text=message)
+            return start_client(update, context)
         message = f'Спасибо! Ваш заказ успешно создан.\nЗаказ будет взят в течении {hours} ч. {minutes} мин.'
         context.bot.send_message(chat_id=chat_id, text=message)
         return start_client(update, context)
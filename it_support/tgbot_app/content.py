@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+import time
+from textwrap import dedent
+from typing import Optional
+
+from django.conf import settings
+from telegram import InlineKeyboardButton
+from telegram import InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+
+def build_keyboard(rows: list[list[InlineKeyboardButton]]) -> InlineKeyboardMarkup:
+    """Keyboard with tuples instead of lists, it is shared by all updates and must not be changed"""
+    return InlineKeyboardMarkup(tuple(tuple(row) for row in rows))
+
+
+class ContentRegistry(object):
+    """
+    Static texts and keyboards of bot menus.
+
+    Keyboards and texts are built once and shared by all updates. Order examples are read from file at bot start
+    and reread only when mtime of file changes, mtime is checked not more often than every check_seconds.
+    """
+
+    CLIENT_MENU_TEXT = 'Здравствуйте, что вы хотите?'
+    CONTRACTOR_MENU_TEXT = 'Выберите действие'
+    MANAGER_MENU_TEXT = 'Что вас интересует'
+    OWNER_MENU_TEXT = 'Что вас интересует'
+    NOT_FOUND_TEXT = 'Вы не являетесь нашим клиентом, пожалуйста обратитесь к менеджеру'
+    CREATE_ORDER_TEXT = dedent('''
+    Вы можете оставить заявку в чате в формате:
+    - Сроки исполнения
+    - Суть заказа
+    - Что-нибудь еще
+
+    Примеры заявок:
+    ''')
+    CONTRACTOR_HELP_TEXT = dedent('''
+    При появлении новых заказов вам будет приходить уведомление,
+    где вы можете взять заказ в работу
+
+    Также текущие доступные заказы вы можете посмотреть по кнопке "Посмотреть заказы"
+
+    Когда вы возьмете заказ вам придет логин и пароль от админки клиента
+
+    Если у вас возникнут вопросы, вы всегда можете задать их заказчику по кнопке "Написать заказчику"
+
+    Как только заказчик вам ответит вам придет уведомление
+
+    После завершения заказа нажмите на кнопку "Завершить заказ"
+
+    Посмотреть сколько заказов вы выполнили и заработает при очередном финансовом
+    периоде вы можете по кнопке "Мой заработок за месяц"
+    ''')
+    ESTIMATE_REQUEST_TEXT = dedent('''
+    Пришлите приблизительную оценку требуемого на выполнения времени в часах
+    Оценка от 1 до 24 часов, если вы считаете, что заказ потребует больше времени
+    обратитесь к менеджерам, мы не оказываем проектную поддержку
+    ''')
+    ORDER_CLOSED_CLIENT_TEXT = dedent('''
+    Подрядчик выполнил ваш заказ, делаем успехов в вашем бизнесе!
+    Если вам нужна будет помощь, мы рядом!
+    ''')
+
+    def __init__(self, order_examples_path: str, check_seconds: float) -> None:
+        self.order_examples_path = order_examples_path
+        self.check_seconds = check_seconds
+        self.order_examples_mtime: Optional[int] = None
+        self.is_loaded = False
+        self.checked_at = 0.0
+        self.create_order_message = self.CREATE_ORDER_TEXT
+        self.lock = threading.Lock()
+
+        self.client_menu_keyboards = {
+            (can_see_contractor_contacts, can_reserve_contractor): self.build_client_menu_keyboard(
+                can_see_contractor_contacts,
+                can_reserve_contractor,
+            )
+            for can_see_contractor_contacts in (False, True)
+            for can_reserve_contractor in (False, True)
+        }
+        self.contractor_menu_keyboard = build_keyboard([
+            [InlineKeyboardButton('Как это работает?', callback_data='how_contractor_bot_work')],
+            [InlineKeyboardButton('Посмотреть заказы', callback_data='watch_orders')],
+            [InlineKeyboardButton('Написать заказчику', callback_data='send_message_to_client')],
+            [InlineKeyboardButton('Завершить заказ', callback_data='close_order')],
+            [InlineKeyboardButton('Мой заработок за месяц', callback_data='my_salary')],
+        ])
+        self.manager_menu_keyboard = build_keyboard([
+            [InlineKeyboardButton('Контакты доступных подрядчиков', callback_data='contacts_available_contractors')],
+        ])
+        self.owner_menu_keyboard = build_keyboard([
+            [
+                InlineKeyboardButton(
+                    'Биллинг подрядчиков за прошлый месяц',
+                    callback_data='contractor_billing_prev_month',
+                ),
+            ],
+            [InlineKeyboardButton('Статистика по заказам', callback_data='orders_stats')],
+            [
+                InlineKeyboardButton('Добавить клиента', callback_data='add_client'),
+                InlineKeyboardButton('Удалить клиента', callback_data='delete_client'),
+            ],
+            [
+                InlineKeyboardButton('Добавить подрядчика', callback_data='add_contractor'),
+                InlineKeyboardButton('Удалить подрядчика', callback_data='delete_contractor'),
+            ],
+            [
+                InlineKeyboardButton('Добавить менеджера', callback_data='add_manager'),
+                InlineKeyboardButton('Удалить менеджера', callback_data='delete_manager'),
+            ],
+            [
+                InlineKeyboardButton('Добавить владельца', callback_data='add_owner'),
+                InlineKeyboardButton('Удалить владельца', callback_data='delete_owner'),
+            ],
+        ])
+        self.get_back_keyboard = build_keyboard([
+            [InlineKeyboardButton('Вернуться назад', callback_data='get_back')],
+        ])
+        self.owner_get_back_keyboard = build_keyboard([
+            [InlineKeyboardButton('Назад', callback_data='get_back')],
+        ])
+        self.get_back_to_order_creation_keyboard = build_keyboard([
+            [InlineKeyboardButton('Вернуться назад', callback_data='get_back_to_order_creation')],
+        ])
+        self.return_to_start_keyboard = build_keyboard([
+            [InlineKeyboardButton('Вернуться в начало', callback_data='return_to_start')],
+        ])
+
+    @staticmethod
+    def build_client_menu_keyboard(
+            can_see_contractor_contacts: bool,
+            can_reserve_contractor: bool,
+    ) -> InlineKeyboardMarkup:
+        keyboard = [
+            [InlineKeyboardButton('Хочу оставить заявку', callback_data='create_order')],
+            [InlineKeyboardButton('Связаться с подрядчиком', callback_data='send_message_to_contractor')],
+        ]
+        if can_see_contractor_contacts:
+            keyboard.append(
+                [
+                    InlineKeyboardButton(
+                        'Хочу получить список подрядчиков, которые мне помогали',
+                        callback_data='see_my_contractors'
+                    )
+                ]
+            )
+        if can_reserve_contractor:
+            keyboard.append(
+                [
+                    InlineKeyboardButton(
+                        'Закрепить последнего подрядчика', callback_data='bind_contractors'
+                    )
+                ]
+            )
+        return build_keyboard(keyboard)
+
+    def get_client_menu_keyboard(self, can_see_contractor_contacts: bool, can_reserve_contractor: bool):
+        return self.client_menu_keyboards[(can_see_contractor_contacts, can_reserve_contractor)]
+
+    def load(self) -> None:
+        """Read order examples if file was changed since last read"""
+        self.checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self.order_examples_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self.is_loaded and mtime == self.order_examples_mtime:
+            return
+        with self.lock:
+            if self.is_loaded and mtime == self.order_examples_mtime:
+                return
+            order_examples = ''
+            if mtime is None:
+                logger.warning('Order examples file %s is not found', self.order_examples_path)
+            else:
+                with open(self.order_examples_path, 'r', encoding='UTF8') as file:
+                    order_examples = file.read()
+            self.create_order_message = self.CREATE_ORDER_TEXT + order_examples
+            self.order_examples_mtime = mtime
+            self.is_loaded = True
+
+    def get_create_order_message(self) -> str:
+        if time.monotonic() - self.checked_at >= self.check_seconds:
+            self.load()
+        return self.create_order_message
+
+
+content = ContentRegistry(settings.TELEGRAM_ORDER_EXAMPLES_PATH, settings.TELEGRAM_CONTENT_CHECK_SECONDS)
@@ -1,28 +1,78 @@
+import datetime
 from textwrap import dedent
 
+from django.utils import timezone
+
 from telegram import InlineKeyboardButton
 from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext.callbackcontext import CallbackContext
 from telegram.update import Update
 
 from support_app.models import Order
-from support_app.models import SystemSettings
 from support_app.models import Contractor
+from support_app.system_settings import system_settings
+from tgbot_app.content import content
+
+ORDERS_PAGE_SIZE = 5
+ORDER_TASK_PREVIEW_LENGTH = 300
+ORDER_KEY_EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
 
 
 def start_contractor(update: Update, context: CallbackContext) -> str:
     """Contractor start function which send a menu"""
     chat_id = update.effective_chat.id
+    context.bot.send_message(
+        text=content.CONTRACTOR_MENU_TEXT,
+        reply_markup=content.contractor_menu_keyboard,
+        chat_id=chat_id,
+    )
+    return 'HANDLE_MENU_CONTRACTOR'
+
+
+def encode_order_key(order: Order) -> str:
+    """Key of order for keyset pagination, it fits in 64 bytes of callback data"""
+    created_at_micros = (order.created_at - ORDER_KEY_EPOCH) // timezone.timedelta(microseconds=1)
+    return f'{created_at_micros}|{order.pk}'
+
+
+def decode_order_key(order_key: str) -> tuple[timezone.datetime, int]:
+    created_at_micros, order_pk = order_key.split('|')
+    return ORDER_KEY_EPOCH + timezone.timedelta(microseconds=int(created_at_micros)), int(order_pk)
+
+
+def get_orders_page_message(
+        orders: list[Order],
+        has_prev: bool,
+        has_next: bool,
+) -> tuple[str, InlineKeyboardMarkup]:
+    """Text and keyboard of orders page, every order has its take button and pages are switched by arrows"""
+    message = 'Заказы, которые можно взять в работу:\n'
+    for number, order in enumerate(orders, start=1):
+        task = order.task
+        if len(task) > ORDER_TASK_PREVIEW_LENGTH:
+            task = task[:ORDER_TASK_PREVIEW_LENGTH] + '...'
+        message += f'\n{number}. {task}\n'
+
     keyboard = [
-        [InlineKeyboardButton('Как это работает?', callback_data='how_contractor_bot_work')],
-        [InlineKeyboardButton('Посмотреть заказы', callback_data='watch_orders')],
-        [InlineKeyboardButton('Написать заказчику', callback_data='send_message_to_client')],
-        [InlineKeyboardButton('Завершить заказ', callback_data='close_order')],
-        [InlineKeyboardButton('Мой заработок за месяц', callback_data='my_salary')],
+        [
+            InlineKeyboardButton(f'Взять {number}', callback_data=f'take_order|{order.pk}')
+            for number, order in enumerate(orders, start=1)
+        ],
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    context.bot.send_message(text='Выберите действие', reply_markup=reply_markup, chat_id=chat_id)
-    return 'HANDLE_MENU_CONTRACTOR'
+    navigation_buttons = []
+    if has_prev:
+        navigation_buttons.append(
+            InlineKeyboardButton('<< Назад', callback_data=f'orders_page|prev|{encode_order_key(orders[0])}')
+        )
+    if has_next:
+        navigation_buttons.append(
+            InlineKeyboardButton('Вперед >>', callback_data=f'orders_page|next|{encode_order_key(orders[-1])}')
+        )
+    if navigation_buttons:
+        keyboard.append(navigation_buttons)
+    keyboard.append([InlineKeyboardButton('Вернуться назад', callback_data='get_back')])
+    return message, InlineKeyboardMarkup(keyboard)
 
 
 def handle_watch_orders_callback(
@@ -35,24 +85,61 @@ def handle_watch_orders_callback(
 
     Return bool means return or not and what return and also message if not return
     """
-    available_orders = list(Order.objects.get_available())
+    available_orders, has_next = Order.objects.get_available_page(ORDERS_PAGE_SIZE)
     if not available_orders:
         message = 'Нет заказов, которые можно взять в работу'
         context.bot.send_message(text=message, chat_id=chat_id)
         return True, start_contractor(update, context), ''
-    for i, order in enumerate(available_orders):
-        # send every order in different message because it contains button to take order
-        message = dedent(f'''
-                Задание:
-                {order.task}
-                ''')
-        keyboard = [
-            [InlineKeyboardButton('Взять в работу', callback_data=f'take_order|{order.pk}')],
-        ]
-        if i == len(available_orders) - 1:
-            keyboard.append([InlineKeyboardButton('Вернуться назад', callback_data='get_back')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        context.bot.send_message(text=message, reply_markup=reply_markup, chat_id=chat_id)
+    # all orders are in one message, pages are switched in it
+    message, reply_markup = get_orders_page_message(available_orders, False, has_next)
+    context.bot.send_message(text=message, reply_markup=reply_markup, chat_id=chat_id)
+    return True, 'HANDLE_MENU_CONTRACTOR', ''
+
+
+def handle_orders_page_callback(
+        update: Update,
+        context: CallbackContext,
+        chat_id: str,
+) -> tuple[bool, str, str]:
+    """
+    Handling orders page switch callbacks, page is shown in the same message.
+
+    Return bool means return or not and what return and also message if not return
+    """
+    query = update.callback_query
+    try:
+        _, direction, order_key = query.data.split('|', 2)
+        order_key = decode_order_key(order_key)
+    except ValueError:
+        return False, '', 'Что-то пошло не так, попробуйте снова получить список заказов'
+
+    if direction == 'prev':
+        available_orders, has_prev = Order.objects.get_available_page(ORDERS_PAGE_SIZE, before=order_key)
+        has_next = True
+    else:
+        available_orders, has_next = Order.objects.get_available_page(ORDERS_PAGE_SIZE, after=order_key)
+        has_prev = True
+    if not available_orders:
+        # orders of page were taken while list was watched
+        available_orders, has_next = Order.objects.get_available_page(ORDERS_PAGE_SIZE)
+        has_prev = False
+    if not available_orders:
+        message = 'Нет заказов, которые можно взять в работу'
+        reply_markup = content.get_back_keyboard
+    else:
+        message, reply_markup = get_orders_page_message(available_orders, has_prev, has_next)
+
+    try:
+        context.bot.edit_message_text(
+            text=message,
+            reply_markup=reply_markup,
+            chat_id=chat_id,
+            message_id=query.message.message_id,
+        )
+    except BadRequest as exc:
+        # the same page is shown again
+        if 'not modified' not in str(exc):
+            raise
     return True, 'HANDLE_MENU_CONTRACTOR', ''
 
 
@@ -69,11 +156,7 @@ def handle_send_message_to_client_callback(
     message = 'У вас нет активного заказа'
     if contractor.has_order_in_work():
         message = 'Напишите сообщение клиенту'
-        keyboard = [
-            [InlineKeyboardButton('Вернуться назад', callback_data='get_back')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        context.bot.send_message(text=message, chat_id=chat_id, reply_markup=reply_markup)
+        context.bot.send_message(text=message, chat_id=chat_id, reply_markup=content.get_back_keyboard)
         return True, 'WAIT_MESSAGE_TO_CLIENT_CONTRACTOR', ''
     return False, '', message
 
@@ -113,17 +196,12 @@ def handle_take_order_callback(
         bad_scenario = True
 
     if not bad_scenario:
-        message = dedent('''
-                Пришлите приблизительную оценку требуемого на выполнения времени в часах
-                Оценка от 1 до 24 часов, если вы считаете, что заказ потребует больше времени
-                обратитесь к менеджерам, мы не оказываем проектную поддержку
-                ''')
         context.user_data['order_in_process'] = order
-        keyboard = [
-            [InlineKeyboardButton('Вернуться в начало', callback_data='return_to_start')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        context.bot.send_message(text=message, chat_id=chat_id, reply_markup=reply_markup)
+        context.bot.send_message(
+            text=content.ESTIMATE_REQUEST_TEXT,
+            chat_id=chat_id,
+            reply_markup=content.return_to_start_keyboard,
+        )
         return True, 'WAIT_ESTIMATE_CONTRACTOR', ''
     return False, '', message
 
@@ -141,12 +219,10 @@ def handle_close_order_callback(
     if contractor.has_order_in_work():
         order_in_work = contractor.get_order_in_work()
         client_chat_id = order_in_work.client.telegram_id
-        order_in_work.close_work()
+        if not order_in_work.close_work():
+            return False, '', message
         # also notify client
-        message_to_client = dedent('''
-                Подрядчик выполнил ваш заказ, делаем успехов в вашем бизнесе!
-                Если вам нужна будет помощь, мы рядом!
-                ''')
+        message_to_client = content.ORDER_CLOSED_CLIENT_TEXT
         if order_in_work.client.tariff.can_reserve_contractor:
             message_to_client += 'Вы можете закрепить последнего подрядчика.'
         context.bot.send_message(text=message_to_client, chat_id=client_chat_id)
@@ -161,12 +237,7 @@ def handle_my_salary_callback(contractor: Contractor) -> tuple[bool, str, str]:
     Return bool means return or not and what return and also message if not return
     """
     closed_orders_count = contractor.get_closed_in_actual_billing_orders().count()
-    try:
-        order_rate = int(SystemSettings.objects.get(
-            'ORDER_RATE'
-        ).parameter_value)
-    except (SystemSettings.DoesNotExist, ValueError):
-        order_rate = 500
+    order_rate = system_settings.get('ORDER_RATE')
     salary = closed_orders_count * order_rate
     message = f'Выполнено заказав в отчетном периоде: {closed_orders_count}. К выплате {salary} руб.'
     return False, '', message
@@ -176,30 +247,14 @@ def handle_menu_contractor(update: Update, context: CallbackContext) -> str:
     """Manager menu handler"""
     chat_id = update.effective_chat.id
     query = update.callback_query
-    contractor = context.user_data['user'].contractor
+    contractor = context.user_data['user']
     is_call_handlers = False
 
     message = 'Я вас не понял, нажмите одну из предложенных кнопок'  # answer when no one of if is True
     if query and query.data in ['get_back', 'return_to_start']:
         return start_contractor(update, context)
     elif query and query.data == 'how_contractor_bot_work':  # contractor request a help
-        message = dedent('''
-        При появлении новых заказов вам будет приходить уведомление,
-        где вы можете взять заказ в работу
-
-        Также текущие доступные заказы вы можете посмотреть по кнопке "Посмотреть заказы"
-
-        Когда вы возьмете заказ вам придет логин и пароль от админки клиента
-
-        Если у вас возникнут вопросы, вы всегда можете задать их заказчику по кнопке "Написать заказчику"
-
-        Как только заказчик вам ответит вам придет уведомление
-
-        После завершения заказа нажмите на кнопку "Завершить заказ"
-
-        Посмотреть сколько заказов вы выполнили и заработает при очередном финансовом
-        периоде вы можете по кнопке "Мой заработок за месяц"
-        ''')
+        message = content.CONTRACTOR_HELP_TEXT
     elif query and query.data == 'watch_orders':  # contractor request to watch list of available orders
         is_return, what_return, message = handle_watch_orders_callback(update, context, chat_id)
         is_call_handlers = True
@@ -212,6 +267,9 @@ def handle_menu_contractor(update: Update, context: CallbackContext) -> str:
     elif query and query.data == 'my_salary':  # contractor request to get his salary in this month
         is_return, what_return, message = handle_my_salary_callback(contractor)
         is_call_handlers = True
+    elif query and query.data.startswith('orders_page'):  # contractor switches page of available orders
+        is_return, what_return, message = handle_orders_page_callback(update, context, chat_id)
+        is_call_handlers = True
     elif query and query.data.startswith('take_order'):  # contractor request to take order
         is_return, what_return, message = handle_take_order_callback(update, context, contractor, chat_id)
         is_call_handlers = True
@@ -232,7 +290,7 @@ def wait_message_to_client_contractor(update: Update, context: CallbackContext)
     if update.message:
         message_to_client = update.message.text
         no_text_message = False
-    contractor = context.user_data['user'].contractor
+    contractor = context.user_data['user']
 
     if query and query.data in ['get_back', 'return_to_start']:
         return start_contractor(update, context)
@@ -261,7 +319,7 @@ def wait_estimate_contractor(update: Update, context: CallbackContext) -> str:
         estimated_time_hours = update.message.text
         no_text_message = False
     order_in_process = context.user_data['order_in_process']
-    contractor = context.user_data['user'].contractor
+    contractor = context.user_data['user']
     if query and query.data == 'return_to_start':
         return start_contractor(update, context)
     elif order_in_process and order_in_process.status != Order.Status.created:  # check if order available and in context
@@ -274,25 +332,24 @@ def wait_estimate_contractor(update: Update, context: CallbackContext) -> str:
         try:
             estimated_time_hours = int(estimated_time_hours)
             if 1 <= estimated_time_hours <= 24:  # limit from DB
-                client_chat_id = order_in_process.client.telegram_id
-                order_in_process.take_in_work(contractor, estimated_time_hours)
                 context.user_data['order_in_process'] = None
-                message_to_client = 'Ваш заказ взят работу! При выполнении пришлем уведомление.'
-                context.bot.send_message(text=message_to_client, chat_id=client_chat_id)
-                # TODO: дешифрование кредсов
-                message = dedent(f'''
-                Заказ успешно взят в работу, приятной работы
-
-                Доступы к сайту:
-                {order_in_process.creds}
-                ''')
+                if order_in_process.take_in_work(contractor, estimated_time_hours):
+                    client_chat_id = order_in_process.client.telegram_id
+                    message_to_client = 'Ваш заказ взят работу! При выполнении пришлем уведомление.'
+                    context.bot.send_message(text=message_to_client, chat_id=client_chat_id)
+                    # TODO: дешифрование кредсов
+                    message = dedent(f'''
+                    Заказ успешно взят в работу, приятной работы
+
+                    Доступы к сайту:
+                    {order_in_process.creds}
+                    ''')
+                else:
+                    # another contractor was faster
+                    message = 'К сожалению заказ уже взяли, попробуйте снова получить список заказов'
             else:
                 message = 'Оценка должна быть от 1 до 24 часов, попробуйте снова или обратитесь к менеджеру'
-                keyboard = [
-                    [InlineKeyboardButton('Вернуться в начало', callback_data='return_to_start')],
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                context.bot.send_message(text=message, chat_id=chat_id, reply_markup=reply_markup)
+                context.bot.send_message(text=message, chat_id=chat_id, reply_markup=content.return_to_start_keyboard)
                 return 'WAIT_ESTIMATE_CONTRACTOR'
         except ValueError:
             # estimate not a number
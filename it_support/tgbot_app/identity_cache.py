@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+
+from support_app.models import BotUser
+from support_app.models import Client
+from support_app.models import Contractor
+from support_app.models import Manager
+from support_app.models import Owner
+
+ROLE_QUERYSETS = {
+    BotUser.Role.client: lambda: Client.objects.select_related('tariff'),
+    BotUser.Role.contractor: lambda: Contractor.objects.all(),
+    BotUser.Role.manager: lambda: Manager.objects.all(),
+    BotUser.Role.owner: lambda: Owner.objects.all(),
+}
+
+
+class IdentityCache(object):
+    """
+    LRU cache with TTL of resolved bot users by telegram chat id.
+
+    Value is concrete role object (Client, Contractor, Manager or Owner) or None for unknown chat.
+    Only identity and role of cached user are trusted, bot_state is read again by BotStateStorage.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict[int, tuple[float, Optional[BotUser]]] = OrderedDict()
+        self.chat_ids_by_user_pk: dict[int, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, chat_id: int) -> tuple[bool, Optional[BotUser]]:
+        """Return is user found in cache and user"""
+        with self.lock:
+            entry = self.entries.get(chat_id)
+            if entry is None:
+                return False, None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                self.pop(chat_id)
+                return False, None
+            self.entries.move_to_end(chat_id)
+            return True, user
+
+    def set(self, chat_id: int, user: Optional[BotUser]) -> None:
+        with self.lock:
+            self.pop(chat_id)
+            self.entries[chat_id] = (time.monotonic() + self.ttl, user)
+            if user is not None:
+                self.chat_ids_by_user_pk[user.pk] = chat_id
+            while len(self.entries) > self.maxsize:
+                self.pop(next(iter(self.entries)))
+
+    def invalidate_user(self, user: BotUser) -> None:
+        """Forget changed user and all unknown chats, because changed user can be one of them"""
+        with self.lock:
+            chat_id = self.chat_ids_by_user_pk.get(user.pk)
+            if chat_id is not None:
+                self.pop(chat_id)
+            if user.telegram_id is not None:
+                self.pop(user.telegram_id)
+            unknown_chat_ids = [
+                unknown_chat_id
+                for unknown_chat_id, (expires_at, cached_user) in self.entries.items()
+                if cached_user is None
+            ]
+            for unknown_chat_id in unknown_chat_ids:
+                self.pop(unknown_chat_id)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.chat_ids_by_user_pk.clear()
+
+    def pop(self, chat_id: int) -> None:
+        """Remove entry, lock should be held by caller"""
+        entry = self.entries.pop(chat_id, None)
+        if entry is None:
+            return
+        user = entry[1]
+        if user is not None and self.chat_ids_by_user_pk.get(user.pk) == chat_id:
+            del self.chat_ids_by_user_pk[user.pk]
+
+
+identity_cache = IdentityCache(
+    maxsize=settings.TELEGRAM_IDENTITY_CACHE_SIZE,
+    ttl=settings.TELEGRAM_IDENTITY_CACHE_TTL,
+)
+
+
+def load_bot_user(chat_id: int, username: Optional[str]) -> Optional[BotUser]:
+    """Find active user by chat id or by nick, sync changed chat id or nick and return concrete role object"""
+    active_users = BotUser.objects.active()
+    try:
+        user = active_users.get(telegram_id=chat_id)
+        if username and user.tg_nick != username:
+            user.tg_nick = username
+            user.save(update_fields=['tg_nick'])
+    except BotUser.DoesNotExist:
+        try:
+            user = active_users.get(tg_nick=username)
+        except BotUser.DoesNotExist:
+            return None
+        user.telegram_id = chat_id
+        user.save(update_fields=['telegram_id'])
+
+    try:
+        return ROLE_QUERYSETS[user.role]().get(pk=user.pk)
+    except (KeyError, BotUser.DoesNotExist):
+        return None
+
+
+def get_bot_user(chat_id: int, username: Optional[str]) -> Optional[BotUser]:
+    """Get user of chat from identity cache or from DB"""
+    is_found, user = identity_cache.get(chat_id)
+    if is_found and (user is None or not username or user.tg_nick == username):
+        return user
+    user = load_bot_user(chat_id, username)
+    identity_cache.set(chat_id, user)
+    return user
@@ -0,0 +1,282 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from django.db import connection
+from telegram.ext import ExtBot
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of latency histogram buckets, last bucket is everything slower
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class Measurement(object):
+    """DB queries and telegram API calls made while one update or job is processed"""
+
+    def __init__(self, kind: str, name: str) -> None:
+        self.kind = kind
+        self.name = name
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.api_calls = 0
+        self.api_seconds = 0.0
+        # telegram calls can be made by message dispatcher threads
+        self.lock = threading.Lock()
+
+    def add_query(self, seconds: float) -> None:
+        with self.lock:
+            self.queries += 1
+            self.db_seconds += seconds
+
+    def add_api_call(self, seconds: float) -> None:
+        with self.lock:
+            self.api_calls += 1
+            self.api_seconds += seconds
+
+
+current_measurement: contextvars.ContextVar[Optional[Measurement]] = contextvars.ContextVar(
+    'current_measurement',
+    default=None,
+)
+
+
+class MetricStats(object):
+    """Aggregated measurements of one handler or job"""
+
+    FIELDS = [
+        'count',
+        'seconds_sum',
+        'seconds_max',
+        'queries_sum',
+        'queries_max',
+        'db_seconds_sum',
+        'api_calls_sum',
+        'api_seconds_sum',
+    ]
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds_sum = 0.0
+        self.seconds_max = 0.0
+        self.queries_sum = 0
+        self.queries_max = 0
+        self.db_seconds_sum = 0.0
+        self.api_calls_sum = 0
+        self.api_seconds_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, seconds: float, measurement: Measurement) -> None:
+        self.count += 1
+        self.seconds_sum += seconds
+        self.seconds_max = max(self.seconds_max, seconds)
+        self.queries_sum += measurement.queries
+        self.queries_max = max(self.queries_max, measurement.queries)
+        self.db_seconds_sum += measurement.db_seconds
+        self.api_calls_sum += measurement.api_calls
+        self.api_seconds_sum += measurement.api_seconds
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+    def merge(self, other: 'MetricStats') -> None:
+        for field in self.FIELDS:
+            if field.endswith('_max'):
+                setattr(self, field, max(getattr(self, field), getattr(other, field)))
+            else:
+                setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.buckets = [count + other_count for count, other_count in zip(self.buckets, other.buckets)]
+
+    def get_percentile_ms(self, percentile: float) -> Optional[float]:
+        """Upper bound of bucket with percentile, None if it is in the last unbounded bucket"""
+        rank = self.count * percentile
+        seen = 0
+        for bucket_bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return bucket_bound
+        return None
+
+    def to_dict(self) -> dict[str, Any]:
+        stats = {field: getattr(self, field) for field in self.FIELDS}
+        stats['buckets'] = self.buckets
+        return stats
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> 'MetricStats':
+        stats = cls()
+        for field in cls.FIELDS:
+            setattr(stats, field, data[field])
+        stats.buckets = data['buckets']
+        return stats
+
+
+class RollingMetrics(object):
+    """Stats per (kind, name) for the last window_seconds, old slots are dropped as a whole"""
+
+    def __init__(self, window_seconds: float, slot_seconds: float = 60) -> None:
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self.slots: deque[tuple[float, dict[tuple[str, str], MetricStats]]] = deque()
+        self.lock = threading.Lock()
+
+    def record(self, measurement: Measurement, seconds: float) -> None:
+        now = time.time()
+        slot_start = now - now % self.slot_seconds
+        with self.lock:
+            if not self.slots or self.slots[-1][0] != slot_start:
+                self.slots.append((slot_start, {}))
+            self.drop_old_slots(now)
+            slot_stats = self.slots[-1][1]
+            key = (measurement.kind, measurement.name)
+            if key not in slot_stats:
+                slot_stats[key] = MetricStats()
+            slot_stats[key].add(seconds, measurement)
+
+    def drop_old_slots(self, now: float) -> None:
+        """Remove slots out of window, lock should be held by caller"""
+        while self.slots and self.slots[0][0] + self.slot_seconds < now - self.window_seconds:
+            self.slots.popleft()
+
+    def get_stats(self) -> dict[tuple[str, str], MetricStats]:
+        stats = {}
+        with self.lock:
+            self.drop_old_slots(time.time())
+            for slot_start, slot_stats in self.slots:
+                for key, metric_stats in slot_stats.items():
+                    if key not in stats:
+                        stats[key] = MetricStats()
+                    stats[key].merge(metric_stats)
+        return stats
+
+
+def count_query(execute: Callable, sql: str, params: Any, many: bool, context: dict) -> Any:
+    """Execute wrapper of DB connection, adds query time to current measurement"""
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        measurement = current_measurement.get()
+        if measurement is not None:
+            measurement.add_query(time.perf_counter() - started_at)
+
+
+class InstrumentedBot(ExtBot):
+    """Bot which adds every telegram API call to current measurement"""
+
+    def _post(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        started_at = time.perf_counter()
+        try:
+            return super()._post(endpoint, *args, **kwargs)
+        finally:
+            measurement = current_measurement.get()
+            if measurement is not None:
+                measurement.add_api_call(time.perf_counter() - started_at)
+
+
+class Instrumentation(object):
+    """
+    Latency, DB queries and telegram API calls of state handlers and jobs of bot.
+
+    Stats are kept in memory for the last window_seconds, every process writes them to its own snapshot file
+    which is read by bot_metrics command. Updates and jobs slower than slow_seconds are logged, 0 turns it off.
+    """
+
+    def __init__(self, window_seconds: float, slow_seconds: float, snapshots_dir: str) -> None:
+        self.metrics = RollingMetrics(window_seconds)
+        self.slow_seconds = slow_seconds
+        self.snapshots_dir = snapshots_dir
+
+    @contextmanager
+    def measure(self, kind: str, name: str) -> Iterator[Measurement]:
+        """Measure code in block, name can be changed inside of it when it becomes known"""
+        measurement = Measurement(kind, name)
+        token = current_measurement.set(measurement)
+        started_at = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_query):
+                yield measurement
+        finally:
+            seconds = time.perf_counter() - started_at
+            current_measurement.reset(token)
+            self.metrics.record(measurement, seconds)
+            if 0 < self.slow_seconds <= seconds:
+                logger.warning(
+                    'Slow %s %s: %.3fs, %d queries (%.3fs), %d telegram calls (%.3fs)',
+                    measurement.kind,
+                    measurement.name,
+                    seconds,
+                    measurement.queries,
+                    measurement.db_seconds,
+                    measurement.api_calls,
+                    measurement.api_seconds,
+                )
+
+    def set_name(self, name: str) -> None:
+        """Set name of current measurement"""
+        measurement = current_measurement.get()
+        if measurement is not None:
+            measurement.name = name
+
+    def wrap_job(self, callback: Callable, name: str) -> Callable:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with self.measure('job', name):
+                return callback(*args, **kwargs)
+
+        return wrapper
+
+    def get_snapshot_path(self) -> Path:
+        return Path(self.snapshots_dir) / f'bot_metrics_{os.getpid()}.json'
+
+    def write_snapshot(self, *args: Any) -> None:
+        """Write current stats of process to snapshot file, args are for job callback"""
+        if not self.snapshots_dir:
+            return
+        snapshot = {
+            'pid': os.getpid(),
+            'created_at': time.time(),
+            'window_seconds': self.metrics.window_seconds,
+            'metrics': [
+                {'kind': kind, 'name': name, **metric_stats.to_dict()}
+                for (kind, name), metric_stats in self.metrics.get_stats().items()
+            ],
+        }
+        path = self.get_snapshot_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # replace is atomic, so reader never sees a half written file
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(snapshot, ensure_ascii=False), encoding='utf8')
+        tmp_path.replace(path)
+        remove_old_snapshots(self.snapshots_dir, self.metrics.window_seconds)
+
+
+def remove_old_snapshots(snapshots_dir: str, window_seconds: float) -> None:
+    """Remove snapshots of stopped processes which were not updated for window_seconds"""
+    for path in Path(snapshots_dir).glob('bot_metrics_*.json'):
+        try:
+            if path.stat().st_mtime + window_seconds < time.time():
+                path.unlink()
+        except FileNotFoundError:
+            # removed by other process
+            pass
+
+
+def read_snapshots(snapshots_dir: str) -> dict[tuple[str, str], MetricStats]:
+    """Merge stats of all bot processes, snapshots of stopped processes are skipped when their window is over"""
+    stats = {}
+    for path in Path(snapshots_dir).glob('bot_metrics_*.json'):
+        snapshot = json.loads(path.read_text(encoding='utf8'))
+        if snapshot['created_at'] + snapshot['window_seconds'] < time.time():
+            continue
+        for metric in snapshot['metrics']:
+            key = (metric['kind'], metric['name'])
+            if key not in stats:
+                stats[key] = MetricStats()
+            stats[key].merge(MetricStats.from_dict(metric))
+    return stats
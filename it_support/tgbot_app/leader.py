@@ -0,0 +1,63 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any
+
+from django.db import DatabaseError
+from django.db import close_old_connections
+
+from tgbot_app.models import BotLease
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease(object):
+    """
+    Leadership of bot process kept by lease in DB.
+
+    Every process renews lease every ttl / 3 seconds, only one of them gets it. If leader dies its lease expires
+    after ttl and another process becomes leader on its next renew. Leader trusts its lease only until
+    ttl after start of last successful renew, so two leaders can't run together even if DB is unavailable
+    """
+
+    def __init__(self, name: str, ttl_seconds: float) -> None:
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.valid_until = 0.0
+
+    @property
+    def renew_interval(self) -> float:
+        return self.ttl_seconds / 3
+
+    def is_held(self) -> bool:
+        return time.monotonic() < self.valid_until
+
+    def renew(self, *args: Any) -> None:
+        """Take or prolong lease, args are for job callback"""
+        was_held = self.is_held()
+        started_at = time.monotonic()
+        try:
+            acquired = BotLease.objects.acquire(self.name, self.holder, self.ttl_seconds)
+        except DatabaseError:
+            logger.exception('Lease %s renew failed', self.name)
+            acquired = False
+        finally:
+            close_old_connections()
+        if acquired:
+            self.valid_until = started_at + self.ttl_seconds
+        elif was_held:
+            self.valid_until = 0.0
+        if acquired != was_held:
+            logger.info('Process %s %s lease %s', self.holder, 'took' if acquired else 'lost', self.name)
+
+    def release(self) -> None:
+        if not self.is_held():
+            return
+        self.valid_until = 0.0
+        try:
+            BotLease.objects.release(self.name, self.holder)
+        except DatabaseError:
+            logger.exception('Lease %s release failed', self.name)
@@ -0,0 +1,52 @@
+import json
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.core.management import CommandError
+
+from tgbot_app.instrumentation import read_snapshots
+
+
+def format_ms(value) -> str:
+    return f'{value:.1f}' if value is not None else 'inf'
+
+
+class Command(BaseCommand):
+    help = 'Show latency, DB queries and telegram calls of bot state handlers and jobs of running bot processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print raw merged stats as JSON')
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_METRICS_DIR:
+            raise CommandError('TELEGRAM_METRICS_DIR is not set, bot processes do not write metrics')
+        stats = read_snapshots(settings.TELEGRAM_METRICS_DIR)
+        # the slowest in total first, they are the first candidates for optimization
+        sorted_stats = sorted(stats.items(), key=lambda item: item[1].seconds_sum, reverse=True)
+
+        if options['json']:
+            metrics = [
+                {'kind': kind, 'name': name, **metric_stats.to_dict()}
+                for (kind, name), metric_stats in sorted_stats
+            ]
+            self.stdout.write(json.dumps(metrics, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f'{"kind":<6} {"name":<45} {"count":>7} {"avg ms":>9} {"p50 ms":>7} {"p95 ms":>7} {"max ms":>9} '
+            f'{"queries":>8} {"max q":>6} {"db ms":>8} {"tg calls":>8} {"tg ms":>8}'
+        )
+        for (kind, name), metric_stats in sorted_stats:
+            count = metric_stats.count
+            self.stdout.write(
+                f'{kind:<6} {name:<45} {count:>7} '
+                f'{metric_stats.seconds_sum / count * 1000:>9.1f} '
+                f'{format_ms(metric_stats.get_percentile_ms(0.5)):>7} '
+                f'{format_ms(metric_stats.get_percentile_ms(0.95)):>7} '
+                f'{metric_stats.seconds_max * 1000:>9.1f} '
+                f'{metric_stats.queries_sum / count:>8.1f} '
+                f'{metric_stats.queries_max:>6} '
+                f'{metric_stats.db_seconds_sum / count * 1000:>8.1f} '
+                f'{metric_stats.api_calls_sum / count:>8.1f} '
+                f'{metric_stats.api_seconds_sum / count * 1000:>8.1f}'
+            )
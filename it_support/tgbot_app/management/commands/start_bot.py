@@ -1,81 +1,75 @@
+import signal
+import threading
+
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management import BaseCommand
+from django.core.management import CommandError
 
+from tgbot_app.states import STATES_FUNCTIONS
 from tgbot_app.tg_bot import TgBot
+from tgbot_app.webhook import check_webhook_settings
+from tgbot_app.workers import UpdatesRouter
 
-from tgbot_app.client_state_functions import start_client
-from tgbot_app.client_state_functions import handle_menu_client
-from tgbot_app.client_state_functions import wait_message_to_contractor_client
-from tgbot_app.client_state_functions import waiting_order_task
-from tgbot_app.client_state_functions import waiting_credentials
-
-from tgbot_app.manager_state_functions import start_manager
-from tgbot_app.manager_state_functions import handle_menu_manager
-
-from tgbot_app.contractor_state_functions import start_contractor
-from tgbot_app.contractor_state_functions import handle_menu_contractor
-from tgbot_app.contractor_state_functions import wait_message_to_client_contractor
-from tgbot_app.contractor_state_functions import wait_estimate_contractor
 
-from tgbot_app.owner_state_functions import start_owner
-from tgbot_app.owner_state_functions import handle_menu_owner
-from tgbot_app.owner_state_functions import waiting_username_client_add
-from tgbot_app.owner_state_functions import waiting_username_contractor_add
-from tgbot_app.owner_state_functions import waiting_username_manager_add
-from tgbot_app.owner_state_functions import waiting_username_owner_add
-from tgbot_app.owner_state_functions import waiting_username_client_delete
-from tgbot_app.owner_state_functions import waiting_username_contractor_delete
-from tgbot_app.owner_state_functions import waiting_username_manager_delete
-from tgbot_app.owner_state_functions import waiting_username_owner_delete
-
-from tgbot_app.unknown_state_functions import start_not_found
+class Command(BaseCommand):
+    help = 'Start telegram bot with long polling or in webhook mode'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--webhook',
+            action='store_true',
+            help='Register webhook (TELEGRAM_WEBHOOK_URL) and run only periodic jobs, '
+                 'updates are processed by web workers',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.TELEGRAM_BOT_WORKERS,
+            help='Bot processes, polled updates are distributed between them by chat id',
+        )
 
-class Command(BaseCommand):
     def handle(self, *args, **options):
         try:
-            start_bot()
+            if options['workers'] < 1:
+                raise CommandError('At least one worker is required')
+            if options['workers'] > 1 and options['webhook']:
+                raise CommandError('Several workers are supported only for polling')
+            if options['webhook']:
+                start_bot_webhook()
+            elif options['workers'] > 1:
+                UpdatesRouter(options['workers']).run()
+            else:
+                start_bot()
         except Exception as exc:
             raise exc
 
 
 def start_bot():
-    bot = TgBot(
-        settings.TELEGRAM_ACCESS_TOKEN,
-        {
-            'Клиент': {
-                'START': start_client,
-                'HANDLE_MENU_CLIENT': handle_menu_client,
-                'WAIT_MESSAGE_TO_CONTRACTOR_CLIENT': wait_message_to_contractor_client,
-                'WAITING_ORDER_TASK': waiting_order_task,
-                'WAITING_CREDENTIALS': waiting_credentials,
-            },
-            'Менеджер': {
-                'START': start_manager,
-                'HANDLE_MENU_MANAGER': handle_menu_manager
-            },
-            'Подрядчик': {
-                'START': start_contractor,
-                'HANDLE_MENU_CONTRACTOR': handle_menu_contractor,
-                'WAIT_MESSAGE_TO_CLIENT_CONTRACTOR': wait_message_to_client_contractor,
-                'WAIT_ESTIMATE_CONTRACTOR': wait_estimate_contractor,
-            },
-            'Владелец': {
-                'START': start_owner,
-                'HANDLE_MENU_OWNER': handle_menu_owner,
-                'WAITING_USERNAME_CLIENT_ADD': waiting_username_client_add,
-                'WAITING_USERNAME_CONTRACTOR_ADD': waiting_username_contractor_add,
-                'WAITING_USERNAME_MANAGER_ADD': waiting_username_manager_add,
-                'WAITING_USERNAME_OWNER_ADD': waiting_username_owner_add,
-                'WAITING_USERNAME_CLIENT_DELETE': waiting_username_client_delete,
-                'WAITING_USERNAME_CONTRACTOR_DELETE': waiting_username_contractor_delete,
-                'WAITING_USERNAME_MANAGER_DELETE': waiting_username_manager_delete,
-                'WAITING_USERNAME_OWNER_DELETE': waiting_username_owner_delete,
-            },
-            'unknown': {
-                'START': start_not_found,
-            },
-        }
-    )
+    bot = TgBot(settings.TELEGRAM_ACCESS_TOKEN, STATES_FUNCTIONS)
     bot.updater.start_polling()
     bot.updater.idle()
+    bot.stop()
+
+
+def start_bot_webhook():
+    if not settings.TELEGRAM_WEBHOOK_URL or not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise CommandError('TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET should be set for webhook mode')
+    try:
+        check_webhook_settings()
+    except ImproperlyConfigured as exc:
+        raise CommandError(str(exc))
+
+    bot = TgBot(settings.TELEGRAM_ACCESS_TOKEN, STATES_FUNCTIONS)
+    bot.set_webhook(settings.TELEGRAM_WEBHOOK_URL, settings.TELEGRAM_WEBHOOK_SECRET)
+    bot.job_queue.start()
+
+    stop_event = threading.Event()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+        signal.signal(stop_signal, lambda signum, frame: stop_event.set())
+    try:
+        stop_event.wait()
+    finally:
+        bot.delete_webhook()
+        bot.job_queue.stop()
+        bot.stop()
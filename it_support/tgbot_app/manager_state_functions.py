@@ -1,19 +1,18 @@
-from telegram import InlineKeyboardButton
-from telegram import InlineKeyboardMarkup
 from telegram.ext.callbackcontext import CallbackContext
 from telegram.update import Update
 
 from support_app.models import Contractor
+from tgbot_app.content import content
 
 
 def start_manager(update: Update, context: CallbackContext) -> str:
     """Manager start function which send a menu"""
-    keyboard = [
-        [InlineKeyboardButton('Контакты доступных подрядчиков', callback_data='contacts_available_contractors')],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     chat_id = update.effective_chat.id
-    context.bot.send_message(text='Что вас интересует', reply_markup=reply_markup, chat_id=chat_id)
+    context.bot.send_message(
+        text=content.MANAGER_MENU_TEXT,
+        reply_markup=content.manager_menu_keyboard,
+        chat_id=chat_id,
+    )
     return 'HANDLE_MENU_MANAGER'
 
 
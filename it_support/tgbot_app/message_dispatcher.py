@@ -0,0 +1,287 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Hashable, Iterable, NamedTuple, Optional
+
+from telegram import Bot
+from telegram import Message
+from telegram.constants import MAX_CAPTION_LENGTH
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import BadRequest
+from telegram.error import NetworkError
+from telegram.error import RetryAfter
+from telegram.error import TelegramError
+
+from tgbot_app.instrumentation import InstrumentedBot
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryResult(NamedTuple):
+    """Result of delivery of one message to one chat"""
+    chat_id: int
+    message: Optional[Message]
+    error: Optional[Exception]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class DigestEntry(NamedTuple):
+    """Part of digest about one object, key tells caller which objects were delivered"""
+    key: Hashable
+    text: str
+
+
+class DigestChunk(NamedTuple):
+    """One message of digest and results of its delivery to every chat"""
+    keys: list[Hashable]
+    text: str
+    results: list[DeliveryResult]
+
+    @property
+    def delivered(self) -> bool:
+        return any(result.ok for result in self.results)
+
+
+def split_digest(title: str, entries: Iterable[DigestEntry], max_length: int = MAX_MESSAGE_LENGTH) -> list[DigestChunk]:
+    """
+    Split digest into messages not longer than max_length, entries are never split between messages.
+    Every message starts with title, too long entry is truncated
+    """
+    chunks = []
+    keys = []
+    text = title
+    for entry in entries:
+        entry_text = entry.text[:max_length - len(title)]
+        if keys and len(text) + len(entry_text) > max_length:
+            chunks.append(DigestChunk(keys, text, []))
+            keys = []
+            text = title
+        keys.append(entry.key)
+        text += entry_text
+    if keys:
+        chunks.append(DigestChunk(keys, text, []))
+    return chunks
+
+
+class TokenBucket(object):
+    """Thread safe token bucket, `rate` tokens per second with burst up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds caller should wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def is_full(self) -> bool:
+        with self.lock:
+            elapsed = time.monotonic() - self.updated_at
+            return self.tokens + elapsed * self.rate >= self.capacity
+
+
+class RateLimiter(object):
+    """
+    Telegram rate limits of the bot: global bucket (limit of the bot) and a bucket for every chat.
+
+    RetryAfter pauses all sending for the time telegram asked
+    """
+
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.chat_buckets_lock = threading.Lock()
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Stop all sending for some seconds"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_for_token(self, chat_id: Optional[int]) -> None:
+        wait_seconds = max(
+            self.paused_until - time.monotonic(),
+            self.get_chat_bucket(chat_id).reserve() if chat_id is not None else 0.0,
+            self.global_bucket.reserve(),
+        )
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+    def get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self.chat_buckets_lock:
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                if len(self.chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                    # full buckets are the same as new ones so they can be dropped
+                    self.chat_buckets = {
+                        bucket_chat_id: chat_bucket
+                        for bucket_chat_id, chat_bucket in self.chat_buckets.items()
+                        if not chat_bucket.is_full()
+                    }
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+                self.chat_buckets[chat_id] = bucket
+            return bucket
+
+
+class RateLimitedBot(InstrumentedBot):
+    """
+    Bot which takes tokens of rate limiter for every sent or edited message.
+
+    Replies of state handlers and messages of dispatcher share the same buckets
+    """
+
+    RATE_LIMITED_ENDPOINTS = {
+        'sendMessage',
+        'sendDocument',
+        'sendPhoto',
+        'sendMediaGroup',
+        'copyMessage',
+        'forwardMessage',
+        'editMessageText',
+        'editMessageCaption',
+        'editMessageReplyMarkup',
+    }
+
+    def __init__(self, *args: Any, rate_limiter: RateLimiter, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def _post(self, endpoint: str, data: dict = None, *args: Any, **kwargs: Any) -> Any:
+        if endpoint not in self.RATE_LIMITED_ENDPOINTS:
+            return super()._post(endpoint, data, *args, **kwargs)
+        self.rate_limiter.wait_for_token((data or {}).get('chat_id'))
+        try:
+            return super()._post(endpoint, data, *args, **kwargs)
+        except RetryAfter as exc:
+            logger.warning('Telegram asked to retry after %s seconds', exc.retry_after)
+            self.rate_limiter.pause(exc.retry_after)
+            raise
+
+
+class MessageDispatcher(object):
+    """
+    Outbound messages sender of bot jobs.
+
+    Messages are sent from the worker pool by RateLimitedBot, which waits for tokens of telegram rate limits.
+    RetryAfter and network errors are retried, network errors with backoff.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            workers: int = 8,
+            max_retries: int = 3,
+            backoff_seconds: float = 1,
+    ) -> None:
+        self.bot = bot
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='message_dispatcher')
+
+    def send_message(self, chat_id: int, text: str, **kwargs: Any) -> 'Future[DeliveryResult]':
+        """Schedule message sending, result of future is DeliveryResult"""
+        return self.submit('send_message', chat_id, text=text, **kwargs)
+
+    def send_document(self, chat_id: int, **kwargs: Any) -> 'Future[DeliveryResult]':
+        """Schedule document sending, result of future is DeliveryResult"""
+        return self.submit('send_document', chat_id, **kwargs)
+
+    def submit(self, method: str, chat_id: int, **kwargs: Any) -> 'Future[DeliveryResult]':
+        # message is sent in context of caller, so its telegram calls are measured as part of caller job
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, self.deliver, method, chat_id, **kwargs)
+
+    def broadcast(self, chat_ids: Iterable[int], text: str, **kwargs: Any) -> list[DeliveryResult]:
+        """Send the same message to many chats in parallel and wait for all results"""
+        futures = [self.send_message(chat_id, text, **kwargs) for chat_id in chat_ids if chat_id is not None]
+        return [future.result() for future in futures]
+
+    def broadcast_digest(
+            self,
+            chat_ids: Iterable[int],
+            title: str,
+            entries: Iterable[DigestEntry],
+            max_messages: int,
+            filename: str = 'digest.txt',
+    ) -> list[DigestChunk]:
+        """
+        Send digest to many chats in parallel and wait for all results.
+
+        Digest is split into messages by entries, messages of one chat are sent in order.
+        Digest of more than max_messages messages is sent as one text document instead
+        """
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id is not None]
+        entries = list(entries)
+        chunks = split_digest(title, entries)
+        if len(chunks) > max_messages:
+            document = (title + ''.join(entry.text for entry in entries)).encode('utf8')
+            futures = [
+                self.send_document(
+                    chat_id,
+                    document=document,
+                    filename=filename,
+                    caption=title[:MAX_CAPTION_LENGTH],
+                )
+                for chat_id in chat_ids
+            ]
+            return [DigestChunk([entry.key for entry in entries], title, [future.result() for future in futures])]
+
+        futures = [self.submit_chain(chat_id, [chunk.text for chunk in chunks]) for chat_id in chat_ids]
+        results_by_chat = [future.result() for future in futures]
+        return [
+            chunk._replace(results=[chat_results[chunk_number] for chat_results in results_by_chat])
+            for chunk_number, chunk in enumerate(chunks)
+        ]
+
+    def submit_chain(self, chat_id: int, texts: list[str]) -> 'Future[list[DeliveryResult]]':
+        """Schedule sending of several messages to one chat one after another"""
+        context = contextvars.copy_context()
+        return self.executor.submit(
+            context.run,
+            lambda: [self.deliver('send_message', chat_id, text=text) for text in texts],
+        )
+
+    def stop(self) -> None:
+        """Wait for scheduled messages and stop workers"""
+        self.executor.shutdown(wait=True)
+
+    def deliver(self, method: str, chat_id: int, **kwargs: Any) -> DeliveryResult:
+        """Send message in current thread with retries, bot waits for rate limits"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                message = getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+                return DeliveryResult(chat_id, message, None)
+            except RetryAfter as exc:
+                # bot paused all sending, so next attempt waits for it
+                error = exc
+            except BadRequest as exc:
+                # request itself is wrong (chat not found, too long text and etc), retry won't help
+                return DeliveryResult(chat_id, None, exc)
+            except NetworkError as exc:
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+                error = exc
+            except TelegramError as exc:
+                # bot was blocked by user, chat migrated and etc
+                return DeliveryResult(chat_id, None, exc)
+        logger.warning('Message to chat %s was not delivered: %s', chat_id, error)
+        return DeliveryResult(chat_id, None, error)
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.13 on 2026-10-18 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='название')),
+                ('holder', models.CharField(max_length=200, verbose_name='процесс владелец')),
+                ('expires_at', models.DateTimeField(verbose_name='истекает')),
+            ],
+            options={
+                'verbose_name': 'аренда бота',
+                'verbose_name_plural': 'аренды бота',
+            },
+        ),
+    ]
@@ -1,3 +1,48 @@
+from django.db import IntegrityError
 from django.db import models
+from django.db.models import Q
+from django.db.transaction import atomic
+from django.utils import timezone
 
-# Create your models here.
+
+class BotLeaseQuerySet(models.QuerySet):
+    def acquire(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """
+        Take or prolong lease for ttl_seconds, return True if holder has it.
+
+        Lease is taken by one conditional UPDATE when it is free or already belongs to holder,
+        so two processes can't take it together. Hosts clocks should be synchronized
+        """
+        now = timezone.now()
+        expires_at = now + timezone.timedelta(seconds=ttl_seconds)
+        if self.filter(Q(holder=holder) | Q(expires_at__lte=now), name=name).update(
+                holder=holder,
+                expires_at=expires_at,
+        ):
+            return True
+        try:
+            with atomic():
+                self.create(name=name, holder=holder, expires_at=expires_at)
+        except IntegrityError:  # lease exists and belongs to another holder
+            return False
+        return True
+
+    def release(self, name: str, holder: str) -> None:
+        """Give lease up, another process takes it without waiting for expiration"""
+        self.filter(name=name, holder=holder).update(expires_at=timezone.now())
+
+
+class BotLease(models.Model):
+    """Lease of work which should be done by one bot process, e.g. periodic jobs"""
+    name = models.CharField('название', max_length=100, unique=True)
+    holder = models.CharField('процесс владелец', max_length=200)
+    expires_at = models.DateTimeField('истекает')
+
+    objects = BotLeaseQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'аренда бота'
+        verbose_name_plural = 'аренды бота'
+
+    def __str__(self):
+        return f'{self.name} ({self.holder})'
@@ -1,13 +1,13 @@
 import csv
-import os
-import random
+import gzip
+import io
 import re
-import time
+import shutil
+import tempfile
 from functools import partial
-from typing import Any
+from typing import IO, Any, Iterable
 
-from telegram import InlineKeyboardButton
-from telegram import InlineKeyboardMarkup
+from django.conf import settings
 from telegram.ext.callbackcontext import CallbackContext
 from telegram.update import Update
 
@@ -18,23 +18,62 @@ from support_app.models import Contractor
 from support_app.models import Manager
 from support_app.models import Owner
 from support_app.models import Tariff
+from tgbot_app.content import content
 
 
-def send_data_in_csv_file(update: Update, context: CallbackContext, filename: str, data_for_writing: list[list[str]]):
-    """Save data in csv and send it."""
-    os_filename = f'{time.time()}_{random.randint(1, 2 ** 20)}_{filename}'
+def get_spooled_file() -> IO[bytes]:
+    """Binary file which is kept in memory up to REPORT_SPOOL_MAX_SIZE bytes and moved to temp dir after it"""
+    return tempfile.SpooledTemporaryFile(
+        max_size=settings.REPORT_SPOOL_MAX_SIZE,
+        dir=settings.REPORT_SPOOL_DIR or None,
+    )
+
+
+def write_csv(file: IO[bytes], header: list[str], rows: Iterable[list[Any]]) -> None:
+    """Write rows one by one to binary file, rows are not collected in memory"""
+    text_file = io.TextIOWrapper(file, encoding='utf8', newline='', write_through=True)
+    try:
+        csv_writer = csv.writer(text_file)
+        csv_writer.writerow(header)
+        csv_writer.writerows(rows)
+    finally:
+        # file should stay open for sending
+        text_file.detach()
+
+
+def gzip_file(file: IO[bytes]) -> IO[bytes]:
+    """Compress file to new spooled file and close source file"""
+    compressed_file = get_spooled_file()
+    with file, gzip.GzipFile(fileobj=compressed_file, mode='wb') as gzip_writer:
+        file.seek(0)
+        shutil.copyfileobj(file, gzip_writer)
+    return compressed_file
+
+
+def send_data_in_csv_file(
+        update: Update,
+        context: CallbackContext,
+        filename: str,
+        header: list[str],
+        rows: Iterable[list[Any]],
+):
+    """
+    Write data in csv and send it.
+
+    Csv is kept in memory and spilled to temp dir only when it is big.
+    File bigger than REPORT_GZIP_MIN_SIZE is sent gzipped.
+    """
     chat_id = update.effective_chat.id
+    file = get_spooled_file()
     try:
-        with open(os_filename, 'w', newline='', encoding='utf8') as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerows(data_for_writing)
-        with open(os_filename, 'rb') as f:
-            context.bot.send_document(document=f, filename=filename, chat_id=chat_id)
+        write_csv(file, header, rows)
+        if 0 < settings.REPORT_GZIP_MIN_SIZE < file.tell():
+            file = gzip_file(file)
+            filename = f'{filename}.gz'
+        file.seek(0)
+        context.bot.send_document(document=file, filename=filename, chat_id=chat_id)
     finally:
-        try:
-            os.remove(os_filename)
-        except FileNotFoundError:
-            pass
+        file.close()
 
 
 def process_bot_user_add(role_to_model: dict[BotUser.Role, dict[str, Any]], username: str, role: Client.Role) -> str:
@@ -127,28 +166,11 @@ def process_bot_user(update: Update, context: CallbackContext, username: str, ro
 def start_owner(update: Update, context: CallbackContext) -> str:
     """Owner start function which send a menu"""
     chat_id = update.effective_chat.id
-    keyboard = [
-        [InlineKeyboardButton('Биллинг подрядчиков за прошлый месяц', callback_data='contractor_billing_prev_month')],
-        [InlineKeyboardButton('Статистика по заказам', callback_data='orders_stats')],
-        [
-            InlineKeyboardButton('Добавить клиента', callback_data='add_client'),
-            InlineKeyboardButton('Удалить клиента', callback_data='delete_client'),
-        ],
-        [
-            InlineKeyboardButton('Добавить подрядчика', callback_data='add_contractor'),
-            InlineKeyboardButton('Удалить подрядчика', callback_data='delete_contractor'),
-        ],
-        [
-            InlineKeyboardButton('Добавить менеджера', callback_data='add_manager'),
-            InlineKeyboardButton('Удалить менеджера', callback_data='delete_manager'),
-        ],
-        [
-            InlineKeyboardButton('Добавить владельца', callback_data='add_owner'),
-            InlineKeyboardButton('Удалить владельца', callback_data='delete_owner'),
-        ],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    context.bot.send_message(text='Что вас интересует', reply_markup=reply_markup, chat_id=chat_id)
+    context.bot.send_message(
+        text=content.OWNER_MENU_TEXT,
+        reply_markup=content.owner_menu_keyboard,
+        chat_id=chat_id,
+    )
     return 'HANDLE_MENU_OWNER'
 
 
@@ -157,41 +179,25 @@ def handle_menu_owner(update: Update, context: CallbackContext) -> str:
     chat_id = update.effective_chat.id
     query = update.callback_query
 
-    keyboard = [
-        [InlineKeyboardButton('Назад', callback_data='get_back')],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = content.owner_get_back_keyboard
 
     if query and query.data == 'contractor_billing_prev_month':  # owner request billing for pay to contractors
         header = ['Подрядчик', 'Выполненных заказов']
-        billing = [
+        billing = (
             [
                 contractor_billing['contractor__tg_nick'],
                 contractor_billing['count_orders'],
             ]
             for contractor_billing
-            in Order.objects.calculate_billing()
-        ]
-        data_for_writing = [header] + billing
+            in Order.objects.calculate_billing().iterator(chunk_size=settings.REPORT_ITERATOR_CHUNK_SIZE)
+        )
         filename = 'billing.csv'
-        send_data_in_csv_file(update, context, filename, data_for_writing)
+        send_data_in_csv_file(update, context, filename, header, billing)
     elif query and query.data == 'orders_stats':  # owner request a stats of clients
         header = ['Начало биллинга', 'Клиент', 'Число заказов']
-        billing_start_index = 0
-        client_name_index = 1
-        orders_count_index = 2
-        clients_months_stats = [
-            [
-                client_month_stat[billing_start_index],
-                client_month_stat[client_name_index],
-                client_month_stat[orders_count_index],
-            ]
-            for client_month_stat
-            in Order.objects.calculate_average_orders_in_month()
-        ]
-        data_for_writing = [header] + clients_months_stats
+        clients_months_stats = Order.objects.calculate_average_orders_in_month()
         filename = 'stats.csv'
-        send_data_in_csv_file(update, context, filename, data_for_writing)
+        send_data_in_csv_file(update, context, filename, header, clients_months_stats)
     elif query:
         for role in ['client', 'contractor', 'manager', 'owner']:
             for action in ['add', 'delete']:
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from support_app.models import BotUser
+from tgbot_app.identity_cache import identity_cache
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_bot_user(sender, instance, update_fields=None, **kwargs) -> None:
+    """Forget cached user when owner menu or admin changes him"""
+    if not isinstance(instance, BotUser):
+        return
+    if update_fields is not None and set(update_fields) <= {'bot_state'}:
+        # bot saves state of cached user itself, it doesn't change identity
+        return
+    identity_cache.invalidate_user(instance)
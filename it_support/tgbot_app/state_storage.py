@@ -0,0 +1,83 @@
+import logging
+import threading
+from typing import Optional
+
+from django.db.transaction import atomic
+
+from support_app.models import BotUser
+
+logger = logging.getLogger(__name__)
+
+
+class BotStateStorage(object):
+    """
+    Persistence of bot_state with minimal writes.
+
+    Unchanged state isn't written at all, changed state is written with single column UPDATE.
+    If coalescing is on, changed states are kept in memory and written by flush() in one transaction.
+    State is read from DB on every update, because user objects are cached and updates of one chat
+    can be processed by different bot processes.
+    """
+
+    def __init__(self, coalesce: bool = False) -> None:
+        self.coalesce = coalesce
+        self.pending_states: dict[int, Optional[str]] = {}
+        self.lock = threading.Lock()
+        self.written_count = 0
+        self.skipped_count = 0
+        self.coalesced_count = 0
+
+    def get_state(self, user: BotUser) -> Optional[str]:
+        """Current state of user including not flushed yet, cached user gets it too"""
+        with self.lock:
+            if user.pk in self.pending_states:
+                user.bot_state = self.pending_states[user.pk]
+                return user.bot_state
+        user.bot_state = BotUser.objects.filter(pk=user.pk).values_list('bot_state', flat=True).first()
+        return user.bot_state
+
+    def save_state(self, user: BotUser, state: Optional[str]) -> None:
+        """Save state of user, its state should be read by get_state while processing of update"""
+        with self.lock:
+            current_state = self.pending_states.get(user.pk, user.bot_state)
+            user.bot_state = state
+            if current_state == state:
+                self.skipped_count += 1
+                return
+            if self.coalesce:
+                if user.pk in self.pending_states:
+                    self.coalesced_count += 1
+                self.pending_states[user.pk] = state
+                return
+        BotUser.objects.filter(pk=user.pk).update(bot_state=state)
+        with self.lock:
+            self.written_count += 1
+
+    def flush(self, *args) -> None:
+        """Write all pending states in one transaction, can be used as job callback"""
+        with self.lock:
+            pending_states, self.pending_states = self.pending_states, {}
+        if not pending_states:
+            return
+        try:
+            with atomic():
+                for user_pk, state in pending_states.items():
+                    BotUser.objects.filter(pk=user_pk).update(bot_state=state)
+        except Exception:
+            with self.lock:
+                # newer states from this moment win
+                self.pending_states = {**pending_states, **self.pending_states}
+            raise
+        with self.lock:
+            self.written_count += len(pending_states)
+
+    def get_stats(self) -> dict[str, int]:
+        """Number of written states and writes which were avoided"""
+        with self.lock:
+            return {
+                'written': self.written_count,
+                'skipped_unchanged': self.skipped_count,
+                'coalesced': self.coalesced_count,
+                'avoided': self.skipped_count + self.coalesced_count,
+                'pending': len(self.pending_states),
+            }
@@ -1,22 +1,42 @@
+import logging
+import threading
 from textwrap import dedent
-from typing import Callable
+from typing import Any, Callable, Iterable, Optional
 
+from django.conf import settings
 from django.db.transaction import atomic
 from django.utils import timezone
 from telegram.ext import CallbackQueryHandler
 from telegram.ext import CommandHandler
 from telegram.ext import Filters
+from telegram.ext import Job
 from telegram.ext import MessageHandler
 from telegram.ext import Updater
 from telegram.ext.callbackcontext import CallbackContext
 from telegram.update import Update
+from telegram.utils.request import Request
 
 from support_app.models import BotUser
 from support_app.models import Manager
 from support_app.models import Contractor
 from support_app.models import Client
 from support_app.models import Order
-from support_app.models import SystemSettings
+from support_app.signals import order_created
+from support_app.signals import order_status_changed
+from support_app.sqlite_profile import optimize_sqlite
+from support_app.system_settings import system_settings
+from tgbot_app.chat_executor import ChatSerialExecutor
+from tgbot_app.content import content
+from tgbot_app.identity_cache import get_bot_user
+from tgbot_app.instrumentation import Instrumentation
+from tgbot_app.leader import LeaderLease
+from tgbot_app.message_dispatcher import DigestEntry
+from tgbot_app.message_dispatcher import MessageDispatcher
+from tgbot_app.message_dispatcher import RateLimitedBot
+from tgbot_app.message_dispatcher import RateLimiter
+from tgbot_app.state_storage import BotStateStorage
+
+logger = logging.getLogger(__name__)
 
 
 def get_user(func: Callable) -> Callable:
@@ -26,22 +46,7 @@ def get_user(func: Callable) -> Callable:
         chat_id = update.effective_chat.id
         username = update.effective_user.username
 
-        try:
-            active_users = BotUser.objects.active()
-            try:
-                user = active_users.get(telegram_id=chat_id)
-                if user.tg_nick != username:
-                    user.tg_nick = username
-                    user.save()
-            except BotUser.DoesNotExist:
-                user = active_users.get(tg_nick=username)
-                if user.telegram_id != chat_id:
-                    user.telegram_id = chat_id
-                    user.save()
-        except BotUser.DoesNotExist:
-            user = None
-
-        context.user_data['user'] = user
+        context.user_data['user'] = get_bot_user(chat_id, username)
         return func(update, context)
 
     return wrapper
@@ -49,7 +54,13 @@ def get_user(func: Callable) -> Callable:
 
 class TgBot(object):
 
-    def __init__(self, tg_token: str, states_functions: dict[str, dict[str, Callable]]) -> None:
+    def __init__(
+            self,
+            tg_token: str,
+            states_functions: dict[str, dict[str, Callable]],
+            run_jobs: bool = True,
+            update_workers: Optional[int] = None,
+    ) -> None:
         """
             states_functions not dict[str, Callable] because it contains many bots like:
             states_functions = {
@@ -62,38 +73,242 @@ class TgBot(object):
                     'state_2_bot_2': func2_bot2,
                 }
             }
+
+            run_jobs=False is used by webhook web workers, they only process updates,
+            periodic jobs are run by start_bot processes, one of them which is leader
+
+            update_workers is size of pool for updates of different chats, TELEGRAM_UPDATE_WORKERS by default,
+            0 processes updates in the calling thread
         """
         self.tg_token = tg_token
         self.states_functions = states_functions
-        self.updater = Updater(token=tg_token, use_context=True)
-        self.updater.dispatcher.add_handler(CommandHandler('start', get_user(self.handle_users_reply)))
-        self.updater.dispatcher.add_handler(CommandHandler('help', self.help_handler))
-        self.updater.dispatcher.add_handler(CallbackQueryHandler(get_user(self.handle_users_reply)))
-        self.updater.dispatcher.add_handler(MessageHandler(Filters.text, get_user(self.handle_users_reply)))
+        self.instrumentation = Instrumentation(
+            window_seconds=settings.TELEGRAM_METRICS_WINDOW_SECONDS,
+            slow_seconds=settings.TELEGRAM_SLOW_HANDLER_SECONDS,
+            snapshots_dir=settings.TELEGRAM_METRICS_DIR,
+        )
+        self.updater = Updater(
+            bot=RateLimitedBot(
+                tg_token,
+                # dispatcher threads, update workers and message dispatcher workers share one connection pool
+                request=Request(
+                    con_pool_size=(
+                        settings.TELEGRAM_SEND_WORKERS
+                        + settings.TELEGRAM_UPDATE_WORKERS
+                        + 8
+                    ),
+                ),
+                # replies of handlers and messages of dispatcher share telegram rate limits
+                rate_limiter=RateLimiter(
+                    global_rate=settings.TELEGRAM_GLOBAL_RATE_LIMIT,
+                    chat_rate=settings.TELEGRAM_CHAT_RATE_LIMIT,
+                ),
+            ),
+            use_context=True,
+        )
+        if update_workers is None:
+            update_workers = settings.TELEGRAM_UPDATE_WORKERS
+        self.chat_executor = None
+        if update_workers > 0:
+            self.chat_executor = ChatSerialExecutor(update_workers)
+        self.message_dispatcher = MessageDispatcher(
+            self.updater.bot,
+            workers=settings.TELEGRAM_SEND_WORKERS,
+        )
+        self.updater.dispatcher.bot_data['message_dispatcher'] = self.message_dispatcher
+        handle_users_reply = self.serialize_by_chat(self.measure_update(get_user(self.handle_users_reply)))
+        help_handler = self.serialize_by_chat(self.measure_update(self.help_handler, 'help'))
+        self.updater.dispatcher.add_handler(CommandHandler('start', handle_users_reply))
+        self.updater.dispatcher.add_handler(CommandHandler('help', help_handler))
+        self.updater.dispatcher.add_handler(CallbackQueryHandler(handle_users_reply))
+        self.updater.dispatcher.add_handler(MessageHandler(Filters.text, handle_users_reply))
         self.updater.dispatcher.add_error_handler(self.error)
         self.job_queue = self.updater.job_queue
+        # order examples are read once here and reread only after file is changed
+        content.load()
+
+        self.state_storage = BotStateStorage(coalesce=settings.TELEGRAM_STATE_COALESCE_SECONDS > 0)
+        if self.state_storage.coalesce:
+            self.run_repeating(
+                self.state_storage.flush,
+                interval=settings.TELEGRAM_STATE_COALESCE_SECONDS,
+                name='flush_bot_states',
+            )
+        if settings.TELEGRAM_METRICS_DIR:
+            self.job_queue.run_repeating(
+                self.instrumentation.write_snapshot,
+                interval=settings.TELEGRAM_METRICS_SNAPSHOT_SECONDS,
+                name='write_metrics_snapshot',
+            )
+
+        self.warning_jobs: dict[int, Job] = {}
+        self.warning_jobs_lock = threading.Lock()
+        order_created.connect(self.on_order_created, sender=Order, dispatch_uid='tgbot_order_created')
+        order_status_changed.connect(
+            self.on_order_status_changed,
+            sender=Order,
+            dispatch_uid='tgbot_order_status_changed',
+        )
+
+        self.leader_lease = None
+        if run_jobs:
+            self.add_periodic_jobs()
+
+    def run_once(self, callback: Callable, when, name: str, context=None) -> Job:
+        """Register one-shot job, its runs are measured by instrumentation under name of callback"""
+        return self.job_queue.run_once(
+            self.instrumentation.wrap_job(callback, callback.__name__),
+            when=when,
+            context=context,
+            name=name,
+        )
+
+    def run_repeating(
+            self,
+            callback: Callable,
+            interval: float,
+            name: str,
+            first: float = None,
+            leader_only: bool = False,
+    ) -> None:
+        """
+        Register periodic job, its runs are measured by instrumentation.
 
+        leader_only job is registered in every bot process but runs only in the one holding leader lease
+        """
+        job_callback = self.instrumentation.wrap_job(callback, name)
+        if leader_only:
+            job_callback = self.run_if_leader(job_callback)
+        self.job_queue.run_repeating(
+            job_callback,
+            interval=interval,
+            first=first,
+            name=name,
+        )
+
+    def run_if_leader(self, callback: Callable) -> Callable:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if self.leader_lease.is_held():
+                return callback(*args, **kwargs)
+
+        return wrapper
+
+    def add_periodic_jobs(self) -> None:
+        """
+        Register periodic jobs of notifications.
+
+        Several bot processes can run together, jobs are run only by the leader so notifications are not doubled
+        """
+        self.leader_lease = LeaderLease('periodic_jobs', settings.TELEGRAM_LEADER_LEASE_SECONDS)
         self.job_queue.run_repeating(
+            self.leader_lease.renew,
+            interval=self.leader_lease.renew_interval,
+            first=0,
+            name='renew_leader_lease',
+        )
+
+        self.run_once(self.seed_order_warnings, when=0, name='seed_order_warnings')
+        self.run_repeating(
             self.handle_warning_orders_not_in_work,
-            interval=60,
+            interval=settings.TELEGRAM_WARNING_ORDERS_SWEEP_SECONDS,
             first=10,
-            name='handle_warning_orders_not_in_work'
+            name='handle_warning_orders_not_in_work',
+            leader_only=True,
         )
 
-        self.job_queue.run_repeating(
+        self.run_repeating(
             self.handle_warning_orders_not_closed,
-            interval=60,
+            interval=settings.TELEGRAM_WARNING_ORDERS_SWEEP_SECONDS,
             first=20,
-            name='handle_warning_orders_not_closed'
+            name='handle_warning_orders_not_closed',
+            leader_only=True,
         )
 
-        self.job_queue.run_repeating(
+        self.run_repeating(
             self.handle_new_orders_inform,
-            interval=60,
+            interval=settings.TELEGRAM_NEW_ORDERS_SWEEP_SECONDS,
             first=30,
-            name='handle_warning_orders_not_closed'
+            name='handle_new_orders_inform',
+            leader_only=True,
         )
 
+        if settings.SQLITE_OPTIMIZE_SECONDS > 0:
+            self.run_repeating(
+                optimize_sqlite,
+                interval=settings.SQLITE_OPTIMIZE_SECONDS,
+                name='optimize_sqlite',
+                leader_only=True,
+            )
+
+    def serialize_by_chat(self, callback: Callable) -> Callable:
+        """
+        Run handler in update workers pool if concurrent mode is on.
+
+        Updates of different chats are processed in parallel, updates of one chat strictly in order,
+        so quick taps of one user can't race on his bot_state
+        """
+
+        def wrapper(update: Update, context: CallbackContext) -> None:
+            if self.chat_executor is None:
+                return callback(update, context)
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            self.chat_executor.submit(chat_id, self.run_handler, callback, update, context)
+
+        return wrapper
+
+    def measure_update(self, callback: Callable, name: str = 'no state') -> Callable:
+        """Measure processing of update, state handler sets name to role and state when they are known"""
+
+        def wrapper(update: Update, context: CallbackContext) -> None:
+            with self.instrumentation.measure('update', name):
+                return callback(update, context)
+
+        return wrapper
+
+    def run_handler(self, callback: Callable, update: Update, context: CallbackContext) -> None:
+        """Run handler outside of dispatcher thread and pass its errors to error handlers"""
+        try:
+            callback(update, context)
+        except Exception as exc:
+            self.updater.dispatcher.dispatch_error(update, exc)
+
+    def stop(self) -> None:
+        """Stop workers of bot after updater was stopped"""
+        order_created.disconnect(sender=Order, dispatch_uid='tgbot_order_created')
+        order_status_changed.disconnect(sender=Order, dispatch_uid='tgbot_order_status_changed')
+        if self.leader_lease is not None:
+            self.leader_lease.release()
+        if self.chat_executor is not None:
+            self.chat_executor.stop()
+        self.state_storage.flush()
+        logger.info('Bot states persistence: %s', self.state_storage.get_stats())
+        self.message_dispatcher.stop()
+        self.instrumentation.write_snapshot()
+        self.updater.bot.request.stop()
+
+    def start_updates_processing(self) -> None:
+        """Start dispatcher without polling, updates are put to its queue by webhook"""
+        dispatcher_thread = threading.Thread(
+            target=self.updater.dispatcher.start,
+            name='tgbot_dispatcher',
+            daemon=True,
+        )
+        dispatcher_thread.start()
+        self.job_queue.start()
+
+    def put_update(self, update_data: dict) -> None:
+        """Enqueue update received by webhook to dispatcher"""
+        update = Update.de_json(update_data, self.updater.bot)
+        self.updater.dispatcher.update_queue.put(update)
+
+    def set_webhook(self, url: str, secret_token: str) -> None:
+        """Ask telegram to send updates to webhook instead of polling"""
+        self.updater.bot.set_webhook(url=url, secret_token=secret_token)
+
+    def delete_webhook(self) -> None:
+        """Ask telegram to stop sending updates to webhook"""
+        self.updater.bot.delete_webhook()
+
     def handle_users_reply(self, update: Update, context: CallbackContext) -> None:
         """
         State machine of bot.
@@ -103,6 +318,7 @@ class TgBot(object):
         user = context.user_data['user']
 
         if user is None:
+            self.instrumentation.set_name('unknown:START')
             self.states_functions['unknown']['START'](update, context)
             return
 
@@ -113,16 +329,15 @@ class TgBot(object):
         else:
             return
 
-        if user_reply == '/start':
+        # read even for /start, saving compares new state with it
+        user_state = self.state_storage.get_state(user)
+        if user_reply == '/start' or not user_state:
             user_state = 'START'
-        else:
-            user_state = user.bot_state
-            user_state = user_state if user_state else 'START'
 
+        self.instrumentation.set_name(f'{user.role}:{user_state}')
         state_handler = self.states_functions[user.role][user_state]
         next_state = state_handler(update, context)
-        user.bot_state = next_state
-        user.save()
+        self.state_storage.save_state(user, next_state)
 
     def error(self, update: Update, context: CallbackContext) -> None:
         """Error handler"""
@@ -134,114 +349,258 @@ class TgBot(object):
         update.message.reply_text("Используйте /start для того, что бы перезапустить бот")
 
     def handle_warning_orders_not_in_work(self, context: CallbackContext) -> None:
+        """
+        Reconciliation sweep of overdue created orders.
+
+        Managers are warned by job of every order at the moment it becomes almost overdue,
+        sweep warns about missed orders, e.g. created by other process or when limit was changed
+        """
+        self.warn_managers_about_orders_not_in_work(Order.objects.get_warning_orders_not_in_work())
+
+    def handle_warning_orders_not_closed(self, context: CallbackContext) -> None:
+        """Reconciliation sweep of overdue in work orders, see handle_warning_orders_not_in_work"""
+        self.warn_managers_about_orders_not_closed(Order.objects.get_warning_orders_not_closed())
+
+    def warn_managers_about_orders_not_in_work(self, orders: Iterable[Order]) -> None:
         """If there are an overdue created orders they should be sent to every manager"""
-        warning_orders_not_in_work = Order.objects.get_warning_orders_not_in_work()
-        if not warning_orders_not_in_work:  # если не будет просроченных заказов, то не отправляем
-            return
-        message = 'Есть заказы, которые долго не берут в работу\n\n' + '\n'.join(
-            [
-                f'Задача: {order.task} \nКонтакт клиента: @{order.client.tg_nick}\n\n'
-                for order in warning_orders_not_in_work
-            ]
+        self.warn_managers(
+            orders,
+            'not_in_work_manager_informed',
+            'Есть заказы, которые долго не берут в работу\n\n',
+            lambda order: f'Задача: {order.task} \nКонтакт клиента: @{order.client.tg_nick}\n\n',
         )
-        managers = Manager.objects.active()
-        for manager in managers:
-            context.bot.send_message(text=message, chat_id=manager.telegram_id)
-        warning_orders_not_in_work.update(not_in_work_manager_informed=True)
 
-    def handle_warning_orders_not_closed(self, context: CallbackContext) -> None:
+    def warn_managers_about_orders_not_closed(self, orders: Iterable[Order]) -> None:
         """If there are an overdue in work orders they should be sent to every manager"""
-        warning_orders_not_closed = Order.objects.get_warning_orders_not_closed()
-        if not warning_orders_not_closed:  # если не будет просроченных заказов, то не отправляем
+        self.warn_managers(
+            orders,
+            'late_work_manager_informed',
+            'Есть заказы, которые не выполнены\n\n',
+            lambda order: (
+                f'Задача: {order.task}\nКонтакт подрядчика: @{order.contractor.tg_nick}'
+                f'\nКонтакт клиента: @{order.client.tg_nick}\n\n'
+            ),
+        )
+
+    def warn_managers(
+            self,
+            orders: Iterable[Order],
+            informed_flag: str,
+            title: str,
+            format_order: Callable[[Order], str],
+    ) -> None:
+        """
+        Send digest about orders to every manager.
+
+        Flag of order is set before sending, so order job, sweep and other bot processes never warn about it twice.
+        Digest is split into messages by orders, if a message was not delivered to anybody flags of its orders
+        are reset and next sweep tries again
+        """
+        claimed_orders = [
+            order for order in orders
+            if Order.objects.filter(pk=order.pk, **{informed_flag: False}).update(**{informed_flag: True})
+        ]
+        if not claimed_orders:  # если не будет просроченных заказов, то не отправляем
             return
-        message = 'Есть заказы, которые не выполнены\n\n' + '\n'.join(
-            [
-                f'Задача: {order.task}\nКонтакт подрядчика: @{order.contractor.tg_nick}\nКонтакт клиента: @{order.client.tg_nick}\n\n'
-                for order in warning_orders_not_closed
-            ]
+        managers_chat_ids = Manager.objects.active().values_list('telegram_id', flat=True)
+        chunks = self.message_dispatcher.broadcast_digest(
+            managers_chat_ids,
+            title,
+            [DigestEntry(order.pk, format_order(order)) for order in claimed_orders],
+            max_messages=settings.TELEGRAM_DIGEST_MAX_MESSAGES,
+            filename='orders.txt',
         )
-        managers = Manager.objects.active()
-        for manager in managers:
-            context.bot.send_message(text=message, chat_id=manager.telegram_id)
-        warning_orders_not_closed.update(late_work_manager_informed=True)
+        not_delivered_orders_pks = [order_pk for chunk in chunks if not chunk.delivered for order_pk in chunk.keys]
+        if not_delivered_orders_pks:
+            Order.objects.filter(pk__in=not_delivered_orders_pks).update(**{informed_flag: False})
+
+    def seed_order_warnings(self, context: CallbackContext) -> None:
+        """Schedule warnings of open orders which were created before start of bot"""
+        for order in Order.objects.get_not_warned_open_orders().iterator():
+            self.schedule_order_warning(order)
+
+    def on_order_status_changed(self, sender, order: Order, **kwargs) -> None:
+        """Order was taken or finished, so warning of previous status is replaced"""
+        self.schedule_order_warning(order)
+
+    def schedule_order_warning(self, order: Order) -> None:
+        """
+        Schedule job which warns managers exactly when order becomes almost overdue.
+
+        Job queue sleeps until the nearest job, so waiting orders cost nothing. Order has one warning job at a time,
+        job of previous status is removed
+        """
+        warning_at = order.get_warning_at()
+        with self.warning_jobs_lock:
+            previous_job = self.warning_jobs.pop(order.pk, None)
+            if previous_job is not None:
+                previous_job.schedule_removal()
+            if warning_at is None:
+                return
+            # job queue takes only pytz datetimes, so moment is passed as delay
+            delay_seconds = max(0.0, (warning_at - timezone.now()).total_seconds())
+            self.warning_jobs[order.pk] = self.run_once(
+                self.handle_order_warning,
+                when=delay_seconds,
+                name=f'warn_order_{order.pk}',
+                context=order.pk,
+            )
+
+    def handle_order_warning(self, context: CallbackContext) -> None:
+        """
+        Order became almost overdue, it is checked again because it could be changed by other process.
+        If warning moment was moved later, e.g. limit was changed, warning is scheduled again
+        """
+        order_pk = context.job.context
+        with self.warning_jobs_lock:
+            if self.warning_jobs.get(order_pk) is context.job:
+                del self.warning_jobs[order_pk]
+        self.warn_managers_about_orders_not_in_work(Order.objects.get_warning_orders_not_in_work().filter(pk=order_pk))
+        self.warn_managers_about_orders_not_closed(Order.objects.get_warning_orders_not_closed().filter(pk=order_pk))
+        order = Order.objects.get_not_warned_open_orders().filter(pk=order_pk, warn_at__gt=timezone.now()).first()
+        if order is not None:
+            self.schedule_order_warning(order)
+
+    def on_order_created(self, sender, order: Order, **kwargs) -> None:
+        """New order is announced from job queue right after creation, not by the next sweep"""
+        self.run_once(self.handle_new_order, when=0, name='handle_new_order', context=order.pk)
+        self.schedule_order_warning(order)
+
+    def handle_new_order(self, context: CallbackContext) -> None:
+        """Inform contractors about just created order"""
+        new_order = self.get_not_informed_order(context.job.context)
+        if new_order is not None:
+            self.inform_about_new_order(new_order)
+
+    def handle_order_escalation(self, context: CallbackContext) -> None:
+        """Assigned contractors didn't take order in their time, so all contractors are informed"""
+        new_order = self.get_not_informed_order(context.job.context)
+        if new_order is not None:
+            self.inform_about_new_order(new_order, escalate=True)
 
     def handle_new_orders_inform(self, context: CallbackContext) -> None:
-        """If there are a new orders contractors should be informed"""
+        """
+        Reconciliation sweep of new orders.
+
+        New orders are announced by order_created signal, sweep informs about orders which were missed,
+        e.g. created by other process or when escalation job was lost with restart of bot
+        """
         new_orders = Order.objects.get_available_not_informed_all().select_related(
             'client',
             'client__tariff',
         )
-        available_contractors = Contractor.objects.get_available()
-
-        try:
-            assigned_contractors_limit = SystemSettings.objects.get(
-                'ASSIGNED_CONTRACTORS_TIME_LIMIT'
-            ).parameter_value
-            assigned_contractors_limit = int(assigned_contractors_limit) / 100
-        except (SystemSettings.DoesNotExist, ValueError):
-            assigned_contractors_limit = 0.2
-
         # it can be not optimal if many new orders but it should be about 5 orders in hour
         # so it not a big chance to have more then 2 orders simultaneously
-        # also it send message to many contractors but telegram don't have bulk message :(
         for new_order in new_orders:
-            # only send message without button
-            # because contractor can do anything and button can broke his process
-            message = dedent(f'''
-            Появился новый заказ, для взятие в работу нажмите "Посмотреть заказы"
-            и выберите данный заказ:
-
-            Задание:
-            {new_order.task}
-            ''')
-            client = new_order.client
-            if not client.contractors.all():
-                # if no assigned contractors then send all available and mark then
-                # send both - assigned and all
-                for contractor in available_contractors:
-                    contractor_chat_id = contractor.telegram_id
-                    context.bot.send_message(text=message, chat_id=contractor_chat_id)
-                with atomic():
-                    new_order.assigned_contractors_informed = True
-                    new_order.all_contractors_informed = True
-                    new_order.save()
-            else:
-                self.process_new_order_with_contractors(
-                    context,
-                    new_order,
-                    client,
-                    assigned_contractors_limit,
-                    message,
-                )
+            self.inform_about_new_order(new_order)
+
+    def get_not_informed_order(self, order_pk: int) -> Optional[Order]:
+        return Order.objects.get_available_not_informed_all().select_related(
+            'client',
+            'client__tariff',
+        ).filter(pk=order_pk).first()
+
+    def inform_about_new_order(self, new_order: Order, escalate: bool = False) -> None:
+        """
+        Inform assigned contractors of client about new order, or all available contractors if client has no
+        assigned ones. After ASSIGNED_CONTRACTORS_TIME_LIMIT share of reaction time all other contractors
+        are informed, escalation job is scheduled exactly at that moment
+        """
+        # only send message without button
+        # because contractor can do anything and button can broke his process
+        message = dedent(f'''
+        Появился новый заказ, для взятие в работу нажмите "Посмотреть заказы"
+        и выберите данный заказ:
+
+        Задание:
+        {new_order.task}
+        ''')
+        client = new_order.client
+        if not client.contractors.exists():
+            # if no assigned contractors then send all available and mark both - assigned and all
+            self.broadcast_new_order(
+                new_order,
+                lambda: Contractor.objects.get_available().values_list('telegram_id', flat=True),
+                message,
+                all_contractors_informed=True,
+            )
+        else:
+            self.process_new_order_with_contractors(new_order, client, message, escalate)
 
     def process_new_order_with_contractors(
             self,
-            context: CallbackContext,
             new_order: Order,
             client: Client,
-            assigned_contractors_limit: float,
             message: str,
+            escalate: bool,
     ):
         # check if time for assigned contractors or all
-        client_tariff_reaction_time_seconds = new_order.client.tariff.reaction_time_minutes * 60
-        seconds_from_created = (timezone.now() - new_order.created_at).total_seconds()
-        is_inform_only_assigned_contractors = False
-        if seconds_from_created / client_tariff_reaction_time_seconds < assigned_contractors_limit:
-            is_inform_only_assigned_contractors = True
-
-        # check that assigned contractors weren't informed too
-        if is_inform_only_assigned_contractors and not new_order.assigned_contractors_informed:
-            for assigned_contractor in client.contractors.all():
-                contractor_chat_id = assigned_contractor.contractor.telegram_id
-                context.bot.send_message(text=message, chat_id=contractor_chat_id)
-                new_order.assigned_contractors_informed = True
-                new_order.save()
-        elif not is_inform_only_assigned_contractors:
+        assigned_contractors_limit = system_settings.get('ASSIGNED_CONTRACTORS_TIME_LIMIT')
+        escalation_at = new_order.created_at + timezone.timedelta(
+            minutes=client.tariff.reaction_time_minutes * assigned_contractors_limit,
+        )
+        is_inform_only_assigned_contractors = not escalate and timezone.now() < escalation_at
+
+        if is_inform_only_assigned_contractors:
+            # check that assigned contractors weren't informed too
+            self.broadcast_new_order(
+                new_order,
+                lambda: client.contractors.select_related('contractor').filter(
+                    contractor__status=BotUser.Status.active,
+                ).values_list('contractor__telegram_id', flat=True),
+                message,
+                assigned_contractors_informed=True,
+            )
+            self.schedule_order_escalation(new_order, escalation_at)
+        else:
             # inform all contractors except assigned
-            for contractor in client.get_not_assigned_contractors():
-                contractor_chat_id = contractor.telegram_id
-                context.bot.send_message(text=message, chat_id=contractor_chat_id)
-                with atomic():
-                    new_order.assigned_contractors_informed = True  # just for be sure
-                    new_order.all_contractors_informed = True
-                    new_order.save()
+            self.broadcast_new_order(
+                new_order,
+                lambda: client.get_not_assigned_contractors().values_list('telegram_id', flat=True),
+                message,
+                all_contractors_informed=True,
+            )
+
+    def schedule_order_escalation(self, new_order: Order, escalation_at: timezone.datetime) -> None:
+        name = f'escalate_order_{new_order.pk}'
+        if not self.job_queue.get_jobs_by_name(name):
+            # job queue takes only pytz datetimes, so moment is passed as delay
+            delay_seconds = max(0.0, (escalation_at - timezone.now()).total_seconds())
+            self.run_once(self.handle_order_escalation, when=delay_seconds, name=name, context=new_order.pk)
+
+    def broadcast_new_order(
+            self,
+            new_order: Order,
+            get_chat_ids: Callable[[], Iterable[int]],
+            message: str,
+            **informed_flags: bool,
+    ) -> None:
+        """
+        Send message about order to contractors if they weren't informed yet.
+
+        Flags are set before sending, so event job and sweep never announce the same order twice.
+        If message was not delivered to anybody flags set by this call are reset and next sweep tries again
+        """
+        set_flags = self.mark_order_informed(new_order, **informed_flags)
+        if not set_flags:
+            return
+        # telegram don't have bulk message, so dispatcher sends them in parallel within rate limits
+        delivery_results = self.message_dispatcher.broadcast(get_chat_ids(), message)
+        if not any(delivery_result.ok for delivery_result in delivery_results):
+            Order.objects.filter(pk=new_order.pk).update(**{flag: False for flag in set_flags})
+
+    @staticmethod
+    def mark_order_informed(new_order: Order, **informed_flags: bool) -> list[str]:
+        """Set informed flags of order if they are not set yet and return flags which were set by this call"""
+        with atomic():
+            not_informed_filter = {flag: False for flag in informed_flags}
+            if not Order.objects.filter(pk=new_order.pk, **not_informed_filter).update(**informed_flags):
+                return []
+            set_flags = list(informed_flags)
+            # all contractors include assigned ones
+            if 'assigned_contractors_informed' not in informed_flags and Order.objects.filter(
+                    pk=new_order.pk,
+                    assigned_contractors_informed=False,
+            ).update(assigned_contractors_informed=True):
+                set_flags.append('assigned_contractors_informed')
+        return set_flags
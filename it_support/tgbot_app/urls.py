@@ -0,0 +1,9 @@
+from django.urls import path
+
+from tgbot_app import views
+
+app_name = 'tgbot_app'
+
+urlpatterns = [
+    path('webhook/', views.telegram_webhook, name='telegram_webhook'),
+]
@@ -1,3 +1,32 @@
-from django.shortcuts import render
+import json
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.http import HttpResponseBadRequest
+from django.http import HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from tgbot_app.webhook import get_webhook_bot
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request: HttpRequest) -> HttpResponse:
+    """Receive telegram update, enqueue it to bot dispatcher and answer immediately"""
+    secret_token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not settings.TELEGRAM_WEBHOOK_SECRET or not constant_time_compare(
+            secret_token,
+            settings.TELEGRAM_WEBHOOK_SECRET,
+    ):
+        return HttpResponseForbidden()
+
+    try:
+        update_data = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    get_webhook_bot().put_update(update_data)
+    return HttpResponse()
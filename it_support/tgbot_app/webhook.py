@@ -0,0 +1,35 @@
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from tgbot_app.states import STATES_FUNCTIONS
+from tgbot_app.tg_bot import TgBot
+
+_webhook_bot: Optional[TgBot] = None
+_webhook_bot_lock = threading.Lock()
+
+
+def check_webhook_settings() -> None:
+    """Web workers can be restarted at any moment, not written states of coalescing would be lost"""
+    if settings.TELEGRAM_STATE_COALESCE_SECONDS > 0:
+        raise ImproperlyConfigured('TELEGRAM_STATE_COALESCE_SECONDS is not supported in webhook mode')
+
+
+def get_webhook_bot() -> TgBot:
+    """
+    Bot of current web worker which processes updates received by webhook.
+
+    It is created on first update, periodic jobs are not run here, they are run by start_bot --webhook.
+    Updates of one chat are processed in order only inside this process, so webhook is served by one web process
+    """
+    global _webhook_bot
+    if _webhook_bot is None:
+        check_webhook_settings()
+        with _webhook_bot_lock:
+            if _webhook_bot is None:
+                bot = TgBot(settings.TELEGRAM_ACCESS_TOKEN, STATES_FUNCTIONS, run_jobs=False)
+                bot.start_updates_processing()
+                _webhook_bot = bot
+    return _webhook_bot
@@ -0,0 +1,115 @@
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+from telegram import Bot
+from telegram import Update
+from telegram.error import RetryAfter
+from telegram.error import TelegramError
+from telegram.utils.request import Request
+
+from tgbot_app.states import STATES_FUNCTIONS
+from tgbot_app.tg_bot import TgBot
+
+logger = logging.getLogger(__name__)
+
+
+def get_partition(update: Update, partitions: int) -> int:
+    """Updates of one chat always go to the same worker, so they are processed in order"""
+    chat_id = update.effective_chat.id if update.effective_chat else 0
+    return chat_id % partitions
+
+
+def run_worker(updates_queue: multiprocessing.Queue) -> None:
+    """Bot process which processes updates put to its queue by router, None in queue stops it"""
+    stop_event = threading.Event()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+        signal.signal(stop_signal, lambda signum, frame: stop_event.set())
+
+    bot = TgBot(settings.TELEGRAM_ACCESS_TOKEN, STATES_FUNCTIONS)
+    bot.start_updates_processing()
+    try:
+        while not stop_event.is_set():
+            try:
+                update_data = updates_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if update_data is None:
+                break
+            bot.put_update(update_data)
+    finally:
+        bot.job_queue.stop()
+        bot.updater.dispatcher.stop()
+        bot.stop()
+
+
+class UpdatesRouter(object):
+    """
+    Bot with several worker processes.
+
+    Telegram gives updates to one poller only, so main process polls them and puts every update to queue of
+    worker chosen by chat id. Every worker is a usual bot with its own update workers and job queue, periodic jobs
+    are run by the one holding leader lease. Dead worker is restarted with the same queue
+    """
+
+    POLL_TIMEOUT_SECONDS = 10
+    STOP_TIMEOUT_SECONDS = 30
+
+    def __init__(self, workers: int) -> None:
+        self.bot = Bot(settings.TELEGRAM_ACCESS_TOKEN, request=Request(con_pool_size=2))
+        self.queues = [multiprocessing.Queue() for _ in range(workers)]
+        self.processes: list[Optional[multiprocessing.Process]] = [None] * workers
+        self.stop_event = threading.Event()
+
+    def start_worker(self, number: int) -> None:
+        # forked worker must not share DB connections with this process
+        connections.close_all()
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(self.queues[number],),
+            name=f'tgbot_worker_{number}',
+        )
+        process.start()
+        self.processes[number] = process
+
+    def restart_dead_workers(self) -> None:
+        for number, process in enumerate(self.processes):
+            if not process.is_alive():
+                logger.warning('Bot worker %d exited with code %s, restarting', number, process.exitcode)
+                self.start_worker(number)
+
+    def run(self) -> None:
+        for stop_signal in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+            signal.signal(stop_signal, lambda signum, frame: self.stop_event.set())
+        for number in range(len(self.queues)):
+            self.start_worker(number)
+
+        # updates can't be polled while webhook is set
+        self.bot.delete_webhook()
+        offset = None
+        try:
+            while not self.stop_event.is_set():
+                self.restart_dead_workers()
+                try:
+                    updates = self.bot.get_updates(offset=offset, timeout=self.POLL_TIMEOUT_SECONDS)
+                except RetryAfter as exc:
+                    self.stop_event.wait(exc.retry_after)
+                    continue
+                except TelegramError as exc:
+                    logger.warning('Polling of updates failed: %s', exc)
+                    self.stop_event.wait(1)
+                    continue
+                for update in updates:
+                    offset = update.update_id + 1
+                    self.queues[get_partition(update, len(self.queues))].put(update.to_dict())
+        finally:
+            for updates_queue in self.queues:
+                updates_queue.put(None)
+            for process in self.processes:
+                process.join(self.STOP_TIMEOUT_SECONDS)
+            self.bot.request.stop()